@@ -1,7 +1,6 @@
 # main.py - 主函数部分
 
 from langchain.agents import AgentType, initialize_agent
-from langchain.memory import ConversationBufferMemory
 from langchain_openai.chat_models import ChatOpenAI
 import os
 import json
@@ -11,6 +10,9 @@ import sys
 from retriever_tool import create_history_aware_retriever_tool
 from linkedin_job_tool import LinkedInJobTool
 from web_search_tool import create_web_search_tool, WebSearchTool
+from answer_streaming import AnswerStreamHandler, ConsolePrinter
+from parallel_agent import PARALLEL_FORMAT_INSTRUCTIONS, ParallelAgentExecutor, ParallelConversationalAgent
+from conversation_memory import DEFAULT_MEMORY_TOKEN_BUDGET, SummarizingTokenBufferMemory
 
 # 导入用户画像相关模块
 from user_profile_collector import get_user_profile_collection_llm, interactive_user_profile_collection
@@ -36,41 +38,74 @@ def save_conversation_to_history(memory, conversation_history):
             memory.chat_memory.add_ai_message(message["content"])
         elif message["role"] == "user":
             memory.chat_memory.add_user_message(message["content"])
-
-def main():
-   
-    # 设置会话ID
-    session_id = "user123"
     
-    # 初始化LLM
-    llm = get_chat_llm()
-    get_user_profile_llm = get_user_profile_collection_llm()
+    # 收集用户画像的对话可能很长，超出token预算的部分折叠进摘要
+    if isinstance(memory, SummarizingTokenBufferMemory):
+        memory.prune()
 
-    # 创建工具实例
+# 知识库目录，目录下的所有PDF都会被索引 9900\knowledge_database
+KNOWLEDGE_DIR = 'knowledge_database'
+
+# 检索索引类型; 多个worker进程时使用"ivfpq"，其倒排表以内存映射方式在进程间共享
+RETRIEVER_INDEX_TYPE = os.environ.get("CAREER_INDEX_TYPE", "flat")
+
+# 自定义后缀
+AGENT_SUFFIX = """Begin!
+
+    Previous conversation history:
+    {chat_history}
+
+    New human input: {input}
+    {agent_scratchpad}"""
+
+# Agent执行模式: True时模型可以在一步中请求多个互不依赖的工具调用，并发执行后合并观察结果；
+# False时使用原来的CONVERSATIONAL_REACT_DESCRIPTION，工具依次调用
+PARALLEL_TOOLS = True
+
+# 欢迎消息
+WELCOME_MESSAGE = (
+    f"Thank you for sharing your information! "
+    f"I'll tailor my guidance to your needs. How can I help with your clean energy career questions today? 😊"
+)
+
+def build_tools(llm, knowledge_dir=KNOWLEDGE_DIR, index_type=RETRIEVER_INDEX_TYPE):
+    """创建Agent使用的工具
+    
+    工具不保存会话状态(检索索引、职位存储、网页缓存和HTTP连接池都是共享的)，
+    每个进程只需要创建一次，所有会话共用。
+    
+    Args:
+        llm: 聊天语言模型
+        knowledge_dir: 知识库目录
+        index_type: 检索索引类型，"flat"、"ivfpq" 或 "hnsw"
+        
+    Returns:
+        list: 工具列表
+    """
     # 1. 历史感知检索工具
-    pdf_path = 'knowledge_database/ED520114.pdf'  # 确保此路径指向您的PDF文件 9900\knowledge_database
-    print(os.path.exists(pdf_path))
-    retriever_tool = create_history_aware_retriever_tool(llm, pdf_path)
+    retriever_tool = create_history_aware_retriever_tool(llm, knowledge_dir, embedding_backend="onnx",
+                                                         index_type=index_type)
     
     # 2. LinkedIn职位搜索工具
-    linkedin_tool = LinkedInJobTool()
+    linkedin_tool = LinkedInJobTool(enrich_top=3)  # 前3个职位附带资历、雇佣类型和职位描述摘要
 
-    # 3. Web搜索工具
-    web_search_tool = create_web_search_tool()
+    # 3. Web搜索工具 (与检索工具共用嵌入模型，对抓取的网页做段落检索)
+    web_search_tool = create_web_search_tool(embeddings=retriever_tool.embeddings)
     
-    # 收集用户画像
-    user_profile, history, corrections= interactive_user_profile_collection(get_user_profile_llm)
-    
-    # 选择模板
-    selected_template = select_template_for_user(user_profile)
+    # 将工具组合成工具列表
+    return [
+        retriever_tool,  # 假设这已经是LangChain Tool类型
+        linkedin_tool.get_tool(),
+        web_search_tool
+    ]
 
+def build_custom_prefix(user_profile, selected_template):
+    """创建包含用户信息的自定义系统提示"""
     # 提取风格指南和工具使用指南
     style_guide = selected_template.get('style_guide', '')
     tool_usage_guidelines = selected_template.get('Tool_Usage_Guidelines', '')
     
-    
-    # 创建包含用户信息的自定义系统提示
-    custom_prefix = f"""You are a professor specializing in clean energy careers guidance.
+    return f"""You are a professor specializing in clean energy careers guidance.
 
     USER PROFILE:
     - Age: {user_profile['age']}
@@ -90,54 +125,95 @@ def main():
     - Ensure your responses maintain the professional tone, expertise level, and structured approach outlined in the style guide while leveraging tools according to the specified guidelines.
     """
 
+def build_agent(llm, tools, user_profile, history=None, verbose=True,
+                memory_token_budget=DEFAULT_MEMORY_TOKEN_BUDGET, parallel_tools=PARALLEL_TOOLS):
+    """为一个会话创建Agent
     
-    # 将工具组合成工具列表
-    tools = [
-        retriever_tool,  # 假设这已经是LangChain Tool类型
-        linkedin_tool.get_tool(),
-        web_search_tool
-
-    ]
+    只创建会话自己的提示和记忆，LLM和工具由调用方创建并在会话之间共用。
     
-    # 设置会话记忆
-    memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+    Args:
+        llm: 聊天语言模型
+        tools: build_tools创建的工具列表
+        user_profile: 用户画像(age、education_background、occupation_status、working_experience)
+        history: 收集用户画像时的对话历史
+        verbose: 是否输出详细的思考过程
+        memory_token_budget: 对话记忆的token预算(摘要 + 最近的对话)
+        parallel_tools: 是否允许一步中并发执行多个工具调用
+        
+    Returns:
+        AgentExecutor: 带会话记忆的Agent
+    """
+    # 选择模板
+    selected_template = select_template_for_user(user_profile)
     
-    # 保存初始对话历史
-    save_conversation_to_history(memory, history)
+    # 设置会话记忆: 最近的对话原样保留，更早的对话折叠进摘要
+    # (用户画像只放在build_custom_prefix生成的系统提示中，不在记忆中重复)
+    memory = SummarizingTokenBufferMemory(
+        llm=llm,
+        memory_key="chat_history",
+        return_messages=True,
+        max_token_limit=memory_token_budget,
+        ai_prefix="CleanEnergyExpert"
+    )
     
-
-    # 自定义后缀
-    suffix = """Begin!
-
-    Previous conversation history:
-    {chat_history}
-
-    New human input: {input}
-    {agent_scratchpad}"""
+    # 保存初始对话历史
+    save_conversation_to_history(memory, history or [])
+
+    # 配置并行工具调用的Agent
+    if parallel_tools:
+        parallel_agent = ParallelConversationalAgent.from_llm_and_tools(
+            llm=llm,
+            tools=tools,
+            prefix=build_custom_prefix(user_profile, selected_template),
+            suffix=AGENT_SUFFIX,
+            format_instructions=PARALLEL_FORMAT_INSTRUCTIONS,
+            ai_prefix="CleanEnergyExpert"
+        )
+        return ParallelAgentExecutor.from_agent_and_tools(
+            agent=parallel_agent,
+            tools=tools,
+            verbose=verbose,
+            memory=memory,
+            handle_parsing_errors=True
+        )
 
     # 配置Agent
-    agent = initialize_agent(
+    return initialize_agent(
         tools=tools,
         llm=llm,
         agent=AgentType.CONVERSATIONAL_REACT_DESCRIPTION,
-        verbose=True,  # 设为True可以看到详细的思考过程
+        verbose=verbose,  # 设为True可以看到详细的思考过程
         memory=memory,
         handle_parsing_errors=True,
         agent_kwargs={
-            "prefix": custom_prefix,
+            "prefix": build_custom_prefix(user_profile, selected_template),
             #"format_instructions": format_instructions,
-            "suffix": suffix,
+            "suffix": AGENT_SUFFIX,
             "ai_prefix": "CleanEnergyExpert"
         }
     )
+
+def main():
+   
+    # 设置会话ID
+    session_id = "user123"
+    
+    # 初始化LLM
+    llm = get_chat_llm()
+    get_user_profile_llm = get_user_profile_collection_llm()
+
+    # 创建工具实例
+    print(os.path.exists(KNOWLEDGE_DIR))
+    tools = build_tools(llm, KNOWLEDGE_DIR)
+    
+    # 收集用户画像
+    user_profile, history, corrections= interactive_user_profile_collection(get_user_profile_llm)
+    
+    # 配置Agent
+    agent = build_agent(llm, tools, user_profile, history)
     
     # 添加欢迎消息
-    welcome_message = (
-        f"Thank you for sharing your information! "
-        f"I'll tailor my guidance to your needs. How can I help with your clean energy career questions today? 😊"
-        
-    )
-    print(f"💬 Chatbot:{welcome_message}")
+    print(f"💬 Chatbot:{WELCOME_MESSAGE}")
     
     # 对话循环
     while True:
@@ -146,11 +222,14 @@ def main():
             print("💬 Chatbot:Thank you for our conversation. Best of luck with your clean energy career journey!")
             break
         
-        # 使用Agent处理用户输入
+        # 使用Agent处理用户输入，最终回答边生成边打印
+        printer = ConsolePrinter("💬 Chatbot:")
         try:
-            response = agent.run(user_input)
-            print(f"💬 Chatbot:{response}")
+            response = agent.run(user_input, callbacks=[AnswerStreamHandler(printer)])
+            printer.finish(response)
         except Exception as e:
+            if printer.streamed:
+                print()
             print(f"Error: {str(e)}")
             print("💬 Chatbot:I apologize for the error. How else can I assist you?")
 
@@ -0,0 +1,154 @@
+# answer_streaming.py - Agent回答的流式输出: 只转发最终回答的token，以及工具调用的开始/结束事件
+
+import asyncio
+import sys
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Set
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# CONVERSATIONAL_REACT_DESCRIPTION的最终回答以"<ai_prefix>:"开头，之前是Thought/Action等中间步骤
+DEFAULT_ANSWER_PREFIX = "CleanEnergyExpert:"
+
+StreamEvent = Dict[str, Any]
+
+
+class AnswerStreamHandler(BaseCallbackHandler):
+    """把Agent的执行过程转换为流式事件
+
+    - {"type": "token", "content": ...}: 最终回答的token，LLM输出中出现answer_prefix之后才开始转发，
+      Thought/Action等中间步骤不会发给用户
+    - {"type": "tool_start", "tool": ..., "input": ...} / {"type": "tool_end", "tool": ...}:
+      工具调用的开始和结束，例如正在调用LinkedIn Job Searcher
+    - {"type": "tool_error", "tool": ..., "error": ...}: 工具调用失败
+
+    回调在事件循环或工作线程中直接执行(run_inline)，emit需要是非阻塞且线程安全的。
+    """
+
+    run_inline = True
+
+    def __init__(self, emit: Callable[[StreamEvent], None], answer_prefix: str = DEFAULT_ANSWER_PREFIX):
+        """初始化回调
+
+        Args:
+            emit: 接收事件的函数
+            answer_prefix: 最终回答的前缀
+        """
+        self.emit = emit
+        self.answer_prefix = answer_prefix
+        # 每次LLM调用尚未确定是否为最终回答的输出
+        self._buffers: Dict[UUID, str] = {}
+        # 已经进入最终回答的LLM调用，以及其中已经输出过非空白内容的调用
+        self._answering: Set[UUID] = set()
+        self._started: Set[UUID] = set()
+        self._tools: Dict[UUID, str] = {}
+
+    def _emit_token(self, run_id: UUID, text: str):
+        """转发回答文本，去掉回答开头的空白"""
+        if run_id not in self._started:
+            text = text.lstrip()
+            if not text:
+                return
+            self._started.add(run_id)
+        self.emit({"type": "token", "content": text})
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        if run_id in self._answering:
+            self._emit_token(run_id, token)
+            return
+
+        # 前缀可能被拆分在多个token中，累积到出现完整前缀为止
+        buffer = self._buffers.get(run_id, "") + token
+        index = buffer.find(self.answer_prefix)
+        if index < 0:
+            self._buffers[run_id] = buffer
+            return
+        del self._buffers[run_id]
+        self._answering.add(run_id)
+        self._emit_token(run_id, buffer[index + len(self.answer_prefix):])
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._buffers.pop(run_id, None)
+        self._answering.discard(run_id)
+        self._started.discard(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self.on_llm_end(None, run_id=run_id)
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self._tools[run_id] = name
+        self.emit({"type": "tool_start", "tool": name, "input": input_str})
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self.emit({"type": "tool_end", "tool": self._tools.pop(run_id, "tool")})
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self.emit({"type": "tool_error", "tool": self._tools.pop(run_id, "tool"), "error": str(error)})
+
+
+async def astream_agent(agent, message: str, answer_prefix: str = DEFAULT_ANSWER_PREFIX) -> AsyncIterator[StreamEvent]:
+    """异步运行Agent，边执行边产出事件
+
+    先产出AnswerStreamHandler的token和工具事件，最后产出 {"type": "answer", "content": 完整回答}。
+    迭代提前结束(例如客户端断开)时取消Agent的执行。
+
+    Args:
+        agent: AgentExecutor
+        message: 用户消息
+        answer_prefix: 最终回答的前缀
+
+    Raises:
+        Exception: Agent执行失败时抛出原始异常
+    """
+    loop = asyncio.get_running_loop()
+    queue: "asyncio.Queue[Optional[StreamEvent]]" = asyncio.Queue()
+
+    def emit(event: StreamEvent):
+        # 工具和LLM的回调可能在线程池中执行
+        loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    handler = AnswerStreamHandler(emit, answer_prefix)
+    task = asyncio.ensure_future(agent.ainvoke({"input": message}, config={"callbacks": [handler]}))
+    # 结束标记排在执行期间产生的所有事件之后
+    task.add_done_callback(lambda _: loop.call_soon_threadsafe(queue.put_nowait, None))
+    try:
+        while True:
+            event = await queue.get()
+            if event is None:
+                break
+            yield event
+        yield {"type": "answer", "content": task.result()["output"]}
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+class ConsolePrinter:
+    """命令行的事件输出: 回答逐字打印，工具调用单独一行提示"""
+
+    def __init__(self, prefix: str = "💬 Chatbot:", stream=None):
+        self.prefix = prefix
+        self.stream = stream or sys.stdout
+        self.streamed = False
+
+    def __call__(self, event: StreamEvent):
+        if event["type"] == "token":
+            if not self.streamed:
+                self.stream.write(self.prefix)
+                self.streamed = True
+            self.stream.write(event["content"])
+        elif event["type"] == "tool_start":
+            self.stream.write(f"🔧 Calling {event['tool']}...\n")
+        elif event["type"] == "tool_error":
+            self.stream.write(f"⚠️ {event['tool']} failed: {event['error']}\n")
+        self.stream.flush()
+
+    def finish(self, response: str):
+        """一轮对话结束: 已经流式输出时换行，否则(例如回答格式解析失败)打印完整回答"""
+        if self.streamed:
+            self.stream.write("\n")
+        else:
+            self.stream.write(f"{self.prefix}{response}\n")
+        self.stream.flush()
+        self.streamed = False
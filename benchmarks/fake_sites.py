@@ -0,0 +1,216 @@
+# fake_sites.py - 本地替代服务器: 用保存的页面模拟LinkedIn和DuckDuckGo，可配置延迟和错误率
+#
+# 用法 (在仓库根目录运行):
+#   python benchmarks/fake_sites.py --port 8765 --latency 0.2 --jitter 0.1 --error-rate 0.05
+#
+# 然后把工具指向本地服务器:
+#   LinkedInJobTool(base_url="http://127.0.0.1:8765")
+#   WebSearchTool(search_url="http://127.0.0.1:8765/html/")
+
+import argparse
+import email.utils
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+from http_replay import Cassette
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# 路径 -> 返回的页面 (LinkedIn搜索结果按pageNum奇偶轮流返回两页，两页之间有重复的职位)
+ROUTES = (
+    (re.compile(r"^/jobs/search/?$"), "linkedin_search"),
+    (re.compile(r"^/jobs-guest/jobs/api/jobPosting/\d+/?$"), "linkedin_job_detail.html"),
+    (re.compile(r"^/html/?$"), "duckduckgo_search"),
+    (re.compile(r"^/pages/.+\.pdf$"), "pdf"),
+    (re.compile(r"^/pages/.+$"), "article_page.html"),
+)
+
+# DuckDuckGo结果中显示的网址，改写为本地服务器上的/pages/<原网址>，抓取正文时也不访问外部网站
+RESULT_URL_PATTERN = re.compile(rb'(class="result__url" href="[^"]*">)\s*([^<\s]+)\s*(</a>)')
+
+# 模拟限流或服务端故障时随机返回的状态码
+ERROR_STATUSES = (429, 503)
+
+# /pages/下的文章页面的修改时间，配合ETag支持条件请求
+PAGE_LAST_MODIFIED = email.utils.formatdate(1672531200, usegmt=True)
+
+
+class FakeSiteServer:
+    """在后台线程中运行的本地HTTP服务器
+
+    每个请求先等待latency ± jitter秒，再以error_rate的概率返回429/503，否则返回对应的页面。
+    设置了cassette时，优先按路径和查询参数返回录制的响应。
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, seed: Optional[int] = None, cassette: Optional[str] = None,
+                 fixtures_dir: str = FIXTURES_DIR):
+        """初始化服务器 (调用start后才开始监听)
+
+        Args:
+            host: 监听地址
+            port: 监听端口，为0时自动选择空闲端口
+            latency: 每个请求的平均延迟(秒)
+            jitter: 延迟的随机波动范围(秒)
+            error_rate: 返回错误状态码的概率
+            seed: 随机数种子，用于复现延迟和错误序列
+            cassette: http_replay录制的cassette目录
+            fixtures_dir: 页面目录
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.fixtures_dir = fixtures_dir
+        self.cassette = Cassette(cassette) if cassette else None
+        self.stats: Counter = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._pages: Dict[str, bytes] = {}
+        self._thread: Optional[threading.Thread] = None
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _page(self, name: str) -> bytes:
+        """读取并缓存页面"""
+        if name not in self._pages:
+            with open(os.path.join(self.fixtures_dir, name), "rb") as f:
+                self._pages[name] = f.read()
+        return self._pages[name]
+
+    def _draw(self) -> Tuple[float, bool]:
+        """抽取本次请求的延迟以及是否返回错误 (random.Random不是线程安全的)"""
+        with self._lock:
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            failed = self._random.random() < self.error_rate
+        return delay, failed
+
+    def respond(self, method: str, path: str,
+                request_headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], bytes]:
+        """计算请求的响应: (状态码, 响应头, 响应体)
+
+        文章页面带有ETag和Last-Modified，请求的If-None-Match或If-Modified-Since匹配时返回304。
+        """
+        request_headers = {name.lower(): value for name, value in (request_headers or {}).items()}
+        parts = urllib.parse.urlsplit(path)
+
+        if self.cassette is not None:
+            entry = self.cassette.find(method, f"http://localhost{path}", match_host=False)
+            if entry is not None:
+                return entry["status"], dict(entry["headers"]), self.cassette.read_body(entry)
+
+        for pattern, name in ROUTES:
+            if pattern.match(parts.path):
+                if name == "linkedin_search":
+                    query = urllib.parse.parse_qs(parts.query)
+                    page = int(query.get("pageNum", ["0"])[0] or 0)
+                    name = f"linkedin_search_page{page % 2}.html"
+                elif name == "duckduckgo_search":
+                    body = RESULT_URL_PATTERN.sub(
+                        lambda m: m.group(1) + f"{self.base_url}/pages/".encode() + m.group(2) + m.group(3),
+                        self._page("duckduckgo_search.html")
+                    )
+                    return 200, {"Content-Type": "text/html; charset=utf-8"}, body
+                elif name == "pdf":
+                    return 200, {"Content-Type": "application/pdf"}, b"%PDF-1.4\n" + b"0" * 200000
+                elif name == "article_page.html":
+                    body = self._page(name)
+                    validators = {"ETag": f'"{hashlib.sha1(body).hexdigest()}"', "Last-Modified": PAGE_LAST_MODIFIED}
+                    if (request_headers.get("if-none-match") == validators["ETag"]
+                            or request_headers.get("if-modified-since") == PAGE_LAST_MODIFIED):
+                        return 304, validators, b""
+                    return 200, {"Content-Type": "text/html; charset=utf-8", **validators}, body
+                return 200, {"Content-Type": "text/html; charset=utf-8"}, self._page(name)
+
+        return 404, {"Content-Type": "text/plain; charset=utf-8"}, b"Not Found"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                delay, failed = server._draw()
+                if delay:
+                    time.sleep(delay)
+                if failed:
+                    with server._lock:
+                        status = server._random.choice(ERROR_STATUSES)
+                    headers, body = {"Content-Type": "text/plain; charset=utf-8", "Retry-After": "1"}, b"Try again later"
+                else:
+                    status, headers, body = server.respond("GET", self.path, dict(self.headers.items()))
+
+                with server._lock:
+                    server.stats[status] += 1
+
+                self.send_response(status)
+                for name, value in headers.items():
+                    if name.lower() not in ("content-length", "transfer-encoding", "connection"):
+                        self.send_header(name, value)
+                if status != 304:
+                    self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # 压测时不输出访问日志
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeSiteServer":
+        """在后台线程中开始监听"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止监听并关闭套接字"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "FakeSiteServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for LinkedIn and DuckDuckGo serving saved pages")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="mean response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform +/- delay jitter in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a 429/503 response")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--cassette", help="serve responses recorded with http_replay.record first")
+    args = parser.parse_args()
+
+    server = FakeSiteServer(args.host, args.port, args.latency, args.jitter, args.error_rate, args.seed, args.cassette)
+    print(f"Serving fake LinkedIn / DuckDuckGo on {server.base_url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
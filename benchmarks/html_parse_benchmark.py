@@ -0,0 +1,136 @@
+# html_parse_benchmark.py - HTML解析微基准: 完整解析树 + 逐个查找 vs 只解析结果子树 + 预编译选择器
+#
+# 用法 (在仓库根目录运行):
+#   python benchmarks/html_parse_benchmark.py --repeat 200
+#
+# 只使用benchmarks/fixtures中保存的页面，不访问外部网站。
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+from bs4 import BeautifulSoup
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from html_parsing import (  # noqa: E402
+    HTML_PARSER,
+    linkedin_job_id,
+    parse_duckduckgo_results,
+    parse_linkedin_job_cards,
+)
+
+FIXTURES_DIR = os.path.join(REPO_ROOT, "benchmarks", "fixtures")
+LINKEDIN_FIXTURES = ["linkedin_search_page0.html", "linkedin_search_page1.html"]
+DUCKDUCKGO_FIXTURES = ["duckduckgo_search.html"]
+
+
+def baseline_linkedin(html: str) -> List[Dict[str, str]]:
+    """原来的实现: html.parser构建整页解析树，再对每张卡片逐个find"""
+    soup = BeautifulSoup(html, "html.parser")
+    jobs = []
+    for card in soup.find_all("div", class_="job-search-card"):
+        title = card.find("h3", class_="base-search-card__title")
+        company = card.find("a", class_="hidden-nested-link")
+        location = card.find("span", class_="job-search-card__location")
+        link = card.find("a", class_="base-card__full-link")
+        if title and company and location and link:
+            href = link.get("href", "")
+            jobs.append({
+                "job_id": linkedin_job_id(card.get("data-entity-urn", ""), href),
+                "title": title.text.strip(),
+                "company": company.text.strip(),
+                "location": location.text.strip(),
+                "link": href,
+            })
+    return jobs
+
+
+def baseline_duckduckgo(html: str) -> List[Dict[str, str]]:
+    """原来的实现: html.parser构建整页解析树，每次调用select时重新编译选择器"""
+    soup = BeautifulSoup(html, "html.parser")
+    results = []
+    for result_div in soup.select(".result")[:5]:
+        title_elem = result_div.select_one(".result__title")
+        link_elem = result_div.select_one(".result__url")
+        snippet_elem = result_div.select_one(".result__snippet")
+        link = link_elem.get_text(strip=True) if link_elem else "No Link"
+        if link and not link.startswith(("http://", "https://")):
+            link = "https://" + link
+        results.append({
+            "title": title_elem.get_text(strip=True) if title_elem else "No Title",
+            "link": link,
+            "snippet": snippet_elem.get_text(strip=True) if snippet_elem else "No Snippet",
+        })
+    return results
+
+
+def time_parser(parse: Callable[[str], list], pages: List[str], repeat: int) -> Dict[str, float]:
+    """对每个页面重复解析，返回每页耗时(毫秒)"""
+    parse(pages[0])  # 预热
+    timings = []
+    for _ in range(repeat):
+        for html in pages:
+            start = time.perf_counter()
+            parse(html)
+            timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "ms_per_page_mean": round(statistics.mean(timings), 3),
+        "ms_per_page_median": round(statistics.median(timings), 3),
+    }
+
+
+def compare(name: str, baseline: Callable[[str], list], targeted: Callable[[str], list],
+            fixtures: List[str], repeat: int) -> Dict[str, object]:
+    """检查两种实现的输出一致，并比较耗时"""
+    pages = []
+    for fixture in fixtures:
+        with open(os.path.join(FIXTURES_DIR, fixture), "r", encoding="utf-8") as f:
+            pages.append(f.read())
+
+    for html in pages:
+        if baseline(html) != targeted(html):
+            raise AssertionError(f"{name}: targeted parser output differs from the baseline")
+
+    before = time_parser(baseline, pages, repeat)
+    after = time_parser(targeted, pages, repeat)
+    return {
+        "pages": len(pages),
+        "bytes_per_page": sum(len(html) for html in pages) // len(pages),
+        "items_per_page": len(targeted(pages[0])),
+        "baseline": before,
+        "targeted": after,
+        "speedup": round(before["ms_per_page_mean"] / after["ms_per_page_mean"], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTML parsing microbenchmark for the job and web search tools")
+    parser.add_argument("--repeat", type=int, default=50, help="times to parse each fixture")
+    parser.add_argument("--output", help="write results to this JSON file instead of stdout")
+    args = parser.parse_args()
+
+    results = {
+        "parser": HTML_PARSER,
+        "linkedin": compare("linkedin", baseline_linkedin, parse_linkedin_job_cards,
+                            LINKEDIN_FIXTURES, args.repeat),
+        "duckduckgo": compare("duckduckgo", baseline_duckduckgo, lambda html: parse_duckduckgo_results(html, limit=5),
+                              DUCKDUCKGO_FIXTURES, args.repeat),
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"Results written to {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# http_replay.py - HTTP录制/回放: 拦截requests.Session.request，把响应保存为本地cassette或从中回放
+#
+# 用法:
+#   from http_replay import record, replay              # benchmarks目录需要在sys.path中
+#
+#   with record("benchmarks/cassettes/linkedin"):      # 访问真实站点并保存响应
+#       LinkedInJobTool(store_path=None).search_jobs("Solar Engineer in California")
+#
+#   with replay("benchmarks/cassettes/linkedin"):      # 不访问网络，返回保存的响应
+#       LinkedInJobTool(store_path=None).search_jobs("Solar Engineer in California")
+#
+# requests.get/post等便捷函数内部都会调用Session.request，因此工具代码不需要任何修改。
+
+import hashlib
+import json
+import os
+import threading
+import urllib.parse
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+from unittest import mock
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# 匹配请求时忽略的查询参数(每次请求都不同的跟踪参数)
+IGNORED_QUERY_PARAMS = {"refId", "trackingId", "trk", "rut"}
+
+# 回放时不保留的响应头(内容已解压，长度可能不同)
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+class ReplayMissError(requests.ConnectionError):
+    """回放模式下cassette中没有对应的请求
+
+    继承ConnectionError，工具代码会把它当作普通的网络错误处理。
+    """
+
+
+def request_key(method: str, url: str, match_host: bool = True) -> str:
+    """请求的匹配键: 方法 + 规范化的URL(查询参数排序，去掉跟踪参数)"""
+    parts = urllib.parse.urlsplit(url)
+    query = sorted(
+        (name, value) for name, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if name not in IGNORED_QUERY_PARAMS
+    )
+    netloc = parts.netloc.lower() if match_host else ""
+    path = parts.path or "/"
+    return f"{method.upper()} {netloc}{path}?{urllib.parse.urlencode(query)}"
+
+
+class Cassette:
+    """保存在目录中的一组录制响应
+
+    - index.json: 请求键 -> 状态码、响应头、URL和响应体文件名
+    - <sha1>.body: 原始响应体
+    """
+
+    def __init__(self, path: str):
+        """加载cassette目录，目录不存在时为空的cassette
+
+        Args:
+            path: cassette目录
+        """
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        index_path = os.path.join(path, "index.json")
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def find(self, method: str, url: str, match_host: bool = True) -> Optional[Dict[str, Any]]:
+        """查找请求对应的录制记录
+
+        Args:
+            method: 请求方法
+            url: 请求URL
+            match_host: 为False时只按路径和查询参数匹配，用于本地替代服务器
+        """
+        if match_host:
+            return self.entries.get(request_key(method, url))
+        key = request_key(method, url, match_host=False)
+        for entry_key, entry in self.entries.items():
+            if request_key(entry_key.split(" ", 1)[0], entry["url"], match_host=False) == key:
+                return entry
+        return None
+
+    def read_body(self, entry: Dict[str, Any]) -> bytes:
+        """读取录制的响应体"""
+        with open(os.path.join(self.path, entry["body"]), "rb") as f:
+            return f.read()
+
+    def add(self, method: str, url: str, response: requests.Response):
+        """保存一个响应 (同一请求再次录制时覆盖)"""
+        key = request_key(method, url)
+        body_name = hashlib.sha1(key.encode("utf-8")).hexdigest() + ".body"
+        headers = {name: value for name, value in response.headers.items() if name.lower() not in DROPPED_HEADERS}
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            with open(os.path.join(self.path, body_name), "wb") as f:
+                f.write(response.content)
+            self.entries[key] = {
+                "url": url,
+                "status": response.status_code,
+                "reason": response.reason,
+                "headers": headers,
+                "body": body_name,
+            }
+
+    def save(self):
+        """写入index.json"""
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            with open(os.path.join(self.path, "index.json"), "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+
+    def build_response(self, entry: Dict[str, Any], url: str) -> requests.Response:
+        """由录制记录构造requests.Response (支持.text/.content和stream=True时的iter_content)"""
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.reason = entry.get("reason", "")
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.url = url
+        response._content = self.read_body(entry)
+        response._content_consumed = True
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers) or "utf-8"
+        return response
+
+
+@contextmanager
+def record(path: str):
+    """录制模式: 请求照常发送，响应同时保存到cassette"""
+    cassette = Cassette(path)
+    original = requests.Session.request
+
+    def recording_request(session, method, url, *args, **kwargs):
+        response = original(session, method, url, *args, **kwargs)
+        cassette.add(method, url, response)
+        return response
+
+    with mock.patch.object(requests.Session, "request", recording_request):
+        try:
+            yield cassette
+        finally:
+            cassette.save()
+
+
+@contextmanager
+def replay(path: str, allow_network: bool = False):
+    """回放模式: 从cassette返回响应，不访问网络
+
+    Args:
+        path: cassette目录
+        allow_network: cassette中没有的请求是否发送到真实站点，为False时抛出ReplayMissError
+    """
+    cassette = Cassette(path)
+    original = requests.Session.request
+
+    def replaying_request(session, method, url, *args, **kwargs):
+        entry = cassette.find(method, url)
+        if entry is not None:
+            return cassette.build_response(entry, url)
+        if allow_network:
+            return original(session, method, url, *args, **kwargs)
+        raise ReplayMissError(f"No recorded response for {request_key(method, url)}")
+
+    with mock.patch.object(requests.Session, "request", replaying_request):
+        yield cassette
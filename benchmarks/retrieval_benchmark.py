@@ -0,0 +1,202 @@
+# retrieval_benchmark.py - 检索基准测试: 索引构建时间、峰值内存、查询延迟、吞吐量和recall@k
+#
+# 用法 (在仓库根目录运行):
+#   python benchmarks/retrieval_benchmark.py --index-type flat --output bench_flat.json
+#   python benchmarks/retrieval_benchmark.py --embedding-backend onnx --index-type hnsw --chunk-size 512
+#
+# 只使用本地的PDF和查询集，不访问外部网站 (嵌入模型首次运行时需要已下载到HuggingFace缓存)。
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import retriever_tool  # noqa: E402
+from retriever_tool import HistoryAwareRetrieverTool  # noqa: E402
+
+DEFAULT_QUERIES = os.path.join(REPO_ROOT, "benchmarks", "retrieval_queries.json")
+DEFAULT_KNOWLEDGE = os.path.join(REPO_ROOT, "knowledge_database")
+
+
+def peak_rss_mb() -> float:
+    """当前进程的峰值常驻内存(MB)"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux上单位为KB，macOS上为字节
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """线性插值的百分位数"""
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _normalize_text(text: str) -> str:
+    """忽略大小写、空白和标点，避免PDF文本提取的差异影响匹配"""
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+
+def recall_at_k(retrieved: List[str], relevant: List[str], k: int) -> float:
+    """前k个分块中找到的相关段落所占比例"""
+    top_k = [_normalize_text(text) for text in retrieved[:k]]
+    found = sum(1 for passage in relevant if any(_normalize_text(passage) in chunk for chunk in top_k))
+    return found / len(relevant)
+
+
+def build_tool(args, cache_dir: str) -> HistoryAwareRetrieverTool:
+    """按命令行参数创建检索工具 (关闭查询缓存，以测量真实的检索开销)"""
+    return HistoryAwareRetrieverTool(
+        None,
+        args.knowledge,
+        k=max(args.k),
+        cache_dir=cache_dir,
+        ingest_workers=args.ingest_workers,
+        embedding_backend=args.embedding_backend,
+        embedding_batch_size=args.embedding_batch_size,
+        embedding_threads=args.embedding_threads,
+        quantize_embeddings=args.quantize,
+        query_cache_size=0,
+        hybrid=not args.dense_only,
+        index_type=args.index_type,
+        index_params=json.loads(args.index_params) if args.index_params else None,
+        search_params=json.loads(args.search_params) if args.search_params else None,
+    )
+
+
+def run_benchmark(args) -> Dict[str, Any]:
+    """运行基准测试并返回结果"""
+    # 分块设置是retriever_tool的模块级常量，同时参与缓存键的计算
+    retriever_tool.CHUNK_SIZE = args.chunk_size
+    retriever_tool.CHUNK_OVERLAP = args.chunk_overlap
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        queries = json.load(f)["queries"]
+
+    with tempfile.TemporaryDirectory(prefix="retriever-bench-") as cache_dir:
+        # 冷启动: 解析、分块、嵌入并保存索引
+        start = time.perf_counter()
+        tool = build_tool(args, cache_dir)
+        build_seconds = time.perf_counter() - start
+
+        # 热启动: 从缓存加载索引
+        start = time.perf_counter()
+        tool = build_tool(args, cache_dir)
+        load_seconds = time.perf_counter() - start
+
+        # 预热一次，排除模型首次推理的开销
+        tool._retrieve(queries[0]["query"])
+
+        latencies = []
+        per_query = []
+        recalls = {k: [] for k in args.k}
+        for _ in range(args.repeat):
+            for item in queries:
+                start = time.perf_counter()
+                docs = tool._retrieve(item["query"])
+                latencies.append(time.perf_counter() - start)
+                if len(per_query) < len(queries):
+                    texts = [doc.page_content for doc in docs]
+                    scores = {k: recall_at_k(texts, item["relevant"], k) for k in args.k}
+                    for k, score in scores.items():
+                        recalls[k].append(score)
+                    per_query.append({"query": item["query"], "recall": scores})
+
+        # 批量异步检索的吞吐量
+        batch = [item["query"] for item in queries] * args.repeat
+        start = time.perf_counter()
+        asyncio.run(tool.aretrieve_many(batch))
+        batch_seconds = time.perf_counter() - start
+
+        chunk_count = len(tool.vectorstore.index_to_docstore_id)
+
+    return {
+        "config": {
+            "knowledge": os.path.relpath(args.knowledge, REPO_ROOT),
+            "chunk_size": args.chunk_size,
+            "chunk_overlap": args.chunk_overlap,
+            "embedding_backend": args.embedding_backend,
+            "embedding_batch_size": args.embedding_batch_size,
+            "embedding_threads": args.embedding_threads,
+            "quantize": args.quantize,
+            "index_type": args.index_type,
+            "index_params": args.index_params,
+            "search_params": args.search_params,
+            "hybrid": not args.dense_only,
+            "queries": len(queries),
+            "repeat": args.repeat,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "metrics": {
+            "chunks": chunk_count,
+            "index_build_seconds": round(build_seconds, 3),
+            "index_load_seconds": round(load_seconds, 3),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "latency_ms": {
+                "p50": round(percentile(latencies, 50) * 1000, 3),
+                "p95": round(percentile(latencies, 95) * 1000, 3),
+                "mean": round(statistics.mean(latencies) * 1000, 3),
+            },
+            "qps_sequential": round(len(latencies) / sum(latencies), 2),
+            "qps_batched": round(len(batch) / batch_seconds, 2),
+            "recall_at_k": {str(k): round(statistics.mean(values), 4) for k, values in recalls.items()},
+        },
+        "per_query": per_query,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline retrieval benchmark for retriever_tool.py")
+    parser.add_argument("--knowledge", default=DEFAULT_KNOWLEDGE, help="PDF file or knowledge directory")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES, help="query / relevant passage set (JSON)")
+    parser.add_argument("--output", help="write results to this JSON file instead of stdout")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10], help="k values for recall@k")
+    parser.add_argument("--repeat", type=int, default=3, help="times to run the query set for latency")
+    parser.add_argument("--chunk-size", type=int, default=retriever_tool.CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=retriever_tool.CHUNK_OVERLAP)
+    parser.add_argument("--ingest-workers", type=int)
+    parser.add_argument("--embedding-backend", default="huggingface", choices=["huggingface", "onnx"])
+    parser.add_argument("--embedding-batch-size", type=int, default=64)
+    parser.add_argument("--embedding-threads", type=int, help="ONNX Runtime intra-op threads (onnx only)")
+    parser.add_argument("--quantize", action="store_true", help="int8 quantized model (onnx only)")
+    parser.add_argument("--index-type", default="flat", choices=["flat", "ivfpq", "hnsw"])
+    parser.add_argument("--index-params", help='JSON build params, e.g. \'{"hnsw_m": 16}\'')
+    parser.add_argument("--search-params", help='JSON search params, e.g. \'{"nprobe": 8}\'')
+    parser.add_argument("--dense-only", action="store_true", help="disable BM25 fusion")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"Results written to {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
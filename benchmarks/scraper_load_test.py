@@ -0,0 +1,170 @@
+# scraper_load_test.py - 抓取工具压测: 在本地替代服务器上并发调用LinkedIn和Web搜索工具，报告吞吐量和尾延迟
+#
+# 用法 (在仓库根目录运行):
+#   python benchmarks/scraper_load_test.py --concurrency 1 4 16 --requests 64 --latency 0.2 --jitter 0.1
+#   python benchmarks/scraper_load_test.py --tools linkedin --error-rate 0.05 --output load_linkedin.json
+#
+# 不访问外部网站: 工具的站点地址指向fake_sites.FakeSiteServer，页面来自benchmarks/fixtures
+# (或--cassette指定的录制结果)。
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from fake_sites import FakeSiteServer  # noqa: E402
+from http_client import get_http_client  # noqa: E402
+from linkedin_job_tool import LinkedInJobTool  # noqa: E402
+from web_search_tool import WebSearchTool  # noqa: E402
+
+LINKEDIN_QUERIES = [
+    "Solar Engineer in California",
+    "Wind Turbine Technician in Texas",
+    "Energy Efficiency Analyst in New York",
+    "Battery Storage Engineer | Grid Integration Engineer in California | Nevada",
+]
+WEB_QUERIES = [
+    "latest trends in solar energy technology",
+    "clean energy industry growth 2023",
+    "emerging battery technologies for renewable energy",
+    "green hydrogen production advancements",
+]
+
+# 工具以字符串返回错误，按前缀识别失败的调用
+FAILURE_PREFIXES = ("Error", "Failed", "Search returned status code")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """线性插值的百分位数"""
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def run_load(call: Callable[[str], str], queries: List[str], total: int, concurrency: int) -> Dict[str, Any]:
+    """用concurrency个线程发出total次调用，统计延迟和失败次数"""
+    def timed(query: str):
+        start = time.perf_counter()
+        try:
+            result = call(query)
+            failed = result.startswith(FAILURE_PREFIXES)
+        except Exception:
+            failed = True
+        return time.perf_counter() - start, failed
+
+    batch = [queries[i % len(queries)] for i in range(total)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(timed, batch))
+    wall_seconds = time.perf_counter() - start
+
+    latencies = [latency for latency, _ in outcomes]
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "failures": sum(1 for _, failed in outcomes if failed),
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(total / wall_seconds, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "max": round(max(latencies) * 1000, 1),
+            "mean": round(statistics.mean(latencies) * 1000, 1),
+        },
+    }
+
+
+def build_calls(args, base_url: str) -> Dict[str, Callable[[str], str]]:
+    """创建指向本地服务器的工具
+
+    关闭本地存储、结果缓存和页面正文缓存，每次调用都会完整抓取页面，只合并并发的相同查询；
+    关闭段落检索，不加载嵌入模型，只测量网络和解析的开销。
+    """
+    calls = {}
+    if "linkedin" in args.tools:
+        linkedin = LinkedInJobTool(
+            store_path=None,
+            pages=args.pages,
+            max_workers=args.tool_workers,
+            enrich_top=args.enrich_top,
+            base_url=base_url,
+        )
+        calls["linkedin"] = linkedin.search_jobs
+    if "web" in args.tools:
+        web = WebSearchTool(search_url=f"{base_url}/html/", cache_size=0, cache_path=None,
+                            fetch_top=args.fetch_top, passage_token_budget=None, page_cache_size=0)
+        calls["web"] = web._run
+    return calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the LinkedIn and web search tools against a local stand-in server")
+    parser.add_argument("--tools", nargs="+", default=["linkedin", "web"], choices=["linkedin", "web"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=64, help="tool calls per tool and concurrency level")
+    parser.add_argument("--latency", type=float, default=0.1, help="mean server delay per HTTP request (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="uniform +/- server delay jitter (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a 429/503 response")
+    parser.add_argument("--seed", type=int, default=9900)
+    parser.add_argument("--cassette", help="serve responses recorded with http_replay.record first")
+    parser.add_argument("--pages", type=int, default=3, help="LinkedIn result pages per search")
+    parser.add_argument("--tool-workers", type=int, default=4, help="LinkedInJobTool max_workers")
+    parser.add_argument("--enrich-top", type=int, default=0, help="LinkedIn listings to enrich with job details")
+    parser.add_argument("--fetch-top", type=int, default=3, help="web results whose pages are fetched and extracted")
+    parser.add_argument("--output", help="write results to this JSON file instead of stdout")
+    args = parser.parse_args()
+
+    results = {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "runs": {},
+    }
+
+    with FakeSiteServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        seed=args.seed, cassette=args.cassette) as server:
+        for name, call in build_calls(args, server.base_url).items():
+            queries = LINKEDIN_QUERIES if name == "linkedin" else WEB_QUERIES
+            call(queries[0])  # 预热
+            runs = []
+            for concurrency in args.concurrency:
+                before = dict(server.stats)
+                run = run_load(call, queries, args.requests, concurrency)
+                run["server_responses"] = {
+                    str(status): count - before.get(status, 0)
+                    for status, count in sorted(server.stats.items()) if count - before.get(status, 0)
+                }
+                runs.append(run)
+            results["runs"][name] = runs
+        # 两个工具共用的HTTP客户端按主机统计的请求数、重试、限速等待和延迟
+        results["client"] = get_http_client().stats()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"Results written to {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# bm25_index.py - 进程内的BM25倒排索引，以及与向量检索结果的倒数排名融合(RRF)
+
+import json
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# 常见英文停用词，不进入倒排索引
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in into is it its of on or that the "
+    "their there these this to was were which will with".split()
+)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-'.][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """分词: 小写后提取字母数字词，保留 "PV-1"、"U.S." 这类带连接符的术语"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """支持增量添加/删除文档的BM25倒排索引
+
+    倒排表为 term -> {doc_id: 词频}，只保存统计信息，不保存原文
+    (原文已经在FAISS的docstore中)。
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add_documents(self, doc_ids: Sequence[str], texts: Sequence[str]):
+        """添加文档 (已存在的doc_id会先被删除)"""
+        self.remove_documents([doc_id for doc_id in doc_ids if doc_id in self.doc_lengths])
+        for doc_id, text in zip(doc_ids, texts):
+            tokens = tokenize(text)
+            for term, tf in Counter(tokens).items():
+                self.postings[term][doc_id] = tf
+            self.doc_lengths[doc_id] = len(tokens)
+            self.total_length += len(tokens)
+
+    def remove_documents(self, doc_ids: Iterable[str]):
+        """删除文档"""
+        doc_ids = {doc_id for doc_id in doc_ids if doc_id in self.doc_lengths}
+        if not doc_ids:
+            return
+        for term in list(self.postings):
+            docs = self.postings[term]
+            for doc_id in doc_ids & docs.keys():
+                del docs[doc_id]
+            if not docs:
+                del self.postings[term]
+        for doc_id in doc_ids:
+            self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """按BM25得分返回前k个文档
+
+        Returns:
+            List[Tuple[str, float]]: (doc_id, 得分)，按得分降序
+        """
+        n_docs = len(self.doc_lengths)
+        if n_docs == 0:
+            return []
+        avg_length = self.total_length / n_docs
+
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+    def save(self, path: str):
+        """保存为JSON"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "k1": self.k1,
+                "b": self.b,
+                "postings": self.postings,
+                "doc_lengths": self.doc_lengths,
+            }, f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """从JSON加载"""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(k1=data["k1"], b=data["b"])
+        index.postings.update(data["postings"])
+        index.doc_lengths = data["doc_lengths"]
+        index.total_length = sum(index.doc_lengths.values())
+        return index
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """倒数排名融合: score(d) = sum(1 / (k + rank))
+
+    Args:
+        rankings: 多个按相关性排序的doc_id列表
+        k: 平滑常数，越大则排名靠后的结果权重越高
+
+    Returns:
+        List[Tuple[str, float]]: (doc_id, 融合得分)，按得分降序
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
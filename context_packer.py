@@ -0,0 +1,175 @@
+# context_packer.py - 按token预算打包检索结果: 去除分块重叠、合并相邻分块
+
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+# gpt-3.5-turbo / gpt-4 使用的编码
+DEFAULT_ENCODING = "cl100k_base"
+
+# 预算剩余不足该值时不再截断加入新的段落
+MIN_PASSAGE_TOKENS = 32
+
+# 没有位置信息时，文本重叠至少包含的词数；更短的相同文本可能只是巧合
+MIN_OVERLAP_WORDS = 3
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(encoding_name: str):
+    import tiktoken
+    return tiktoken.get_encoding(encoding_name)
+
+
+def count_tokens(text: str, encoding_name: str = DEFAULT_ENCODING) -> int:
+    """用tiktoken计算token数"""
+    return len(_get_encoding(encoding_name).encode(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, encoding_name: str = DEFAULT_ENCODING) -> str:
+    """截断文本到最多max_tokens个token"""
+    encoding = _get_encoding(encoding_name)
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens]).rstrip() + "..."
+
+
+def _is_word_boundary(text: str, index: int) -> bool:
+    """text在index处是否为词边界(两侧不同时是字母或数字)"""
+    return index <= 0 or index >= len(text) or not (text[index - 1].isalnum() and text[index].isalnum())
+
+
+def _overlap_length(previous: str, following: str, max_length: int) -> int:
+    """previous的后缀与following的前缀重叠的最大长度
+
+    重叠的两端都必须落在词边界上，并且至少包含MIN_OVERLAP_WORDS个词。
+    """
+    for length in range(min(len(previous), len(following), max_length), 0, -1):
+        if (previous.endswith(following[:length])
+                and _is_word_boundary(previous, len(previous) - length)
+                and _is_word_boundary(following, length)
+                and len(following[:length].split()) >= MIN_OVERLAP_WORDS):
+            return length
+    return 0
+
+
+def _known_overlap(previous: Document, following: Document) -> Optional[int]:
+    """根据metadata中的页码和start_index计算两个相邻分块的重叠长度，没有位置信息时返回None"""
+    previous_start = previous.metadata.get("start_index")
+    following_start = following.metadata.get("start_index")
+    if previous_start is None or following_start is None or previous_start < 0 or following_start < 0:
+        return None
+    # 每一页单独分块，不同页的分块之间没有重叠
+    if previous.metadata.get("page") != following.metadata.get("page"):
+        return 0
+    overlap = previous_start + len(previous.page_content) - following_start
+    return max(0, min(overlap, len(following.page_content)))
+
+
+def _merge_texts(previous: str, following: str, max_overlap: int, overlap: Optional[int] = None) -> str:
+    """拼接两个相邻分块，去掉分块重叠(chunk_overlap)造成的重复文本
+
+    Args:
+        previous: 已合并的文本
+        following: 下一个分块
+        max_overlap: 检测重叠文本的最大字符数
+        overlap: 由位置信息得到的重叠长度，为None时根据文本检测
+    """
+    if overlap is None:
+        overlap = _overlap_length(previous, following, max_overlap)
+    if overlap and previous.endswith(following[:overlap]):
+        return previous + following[overlap:]
+    return previous + "\n" + following
+
+
+def _group_adjacent(docs: List[Document]) -> List[Tuple[int, List[Document]]]:
+    """把同一文件中序号连续的分块分为一组
+
+    Returns:
+        List[Tuple[int, List[Document]]]: (组内最靠前的检索排名, 按文件内顺序排列的分块)，按排名排序
+    """
+    ranked = []
+    seen = set()
+    for rank, doc in enumerate(docs):
+        key = doc.metadata.get("id") or doc.page_content
+        if key in seen:
+            continue
+        seen.add(key)
+        ranked.append((rank, doc))
+
+    # 没有顺序信息的分块各自成组
+    orderable = [(rank, doc) for rank, doc in ranked if "chunk" in doc.metadata]
+    groups = [(rank, [doc]) for rank, doc in ranked if "chunk" not in doc.metadata]
+
+    orderable.sort(key=lambda item: (str(item[1].metadata.get("source", "")), item[1].metadata["chunk"]))
+    for rank, doc in orderable:
+        if groups and "chunk" in groups[-1][1][-1].metadata:
+            last_rank, members = groups[-1]
+            last = members[-1]
+            if (last.metadata.get("source") == doc.metadata.get("source")
+                    and doc.metadata["chunk"] == last.metadata["chunk"] + 1):
+                members.append(doc)
+                groups[-1] = (min(last_rank, rank), members)
+                continue
+        groups.append((rank, [doc]))
+
+    return sorted(groups, key=lambda group: group[0])
+
+
+def pack_documents(docs: List[Document], token_budget: Optional[int] = None, max_overlap: int = 100,
+                   encoding_name: str = DEFAULT_ENCODING, show_source: bool = False) -> Tuple[str, Dict[str, Any]]:
+    """把检索到的分块打包为不超过token预算的上下文
+
+    1. 去掉重复的分块
+    2. 合并同一文件中相邻的分块，并去掉它们之间的重叠文本
+    3. 按检索排名依次加入段落，超出预算的段落被截断，之后的段落被丢弃
+
+    Args:
+        docs: 按相关性排序的检索结果
+        token_budget: token预算，为None时不限制
+        max_overlap: 检测重叠文本的最大字符数(应不小于分块时的chunk_overlap)
+        encoding_name: tiktoken编码名称
+        show_source: 是否在每个段落的标题后注明metadata中的source(如网页URL)
+
+    Returns:
+        Tuple[str, Dict[str, Any]]: (打包后的文本, 统计信息)
+    """
+    # 未打包时的格式，作为节省token数的基准
+    unpacked = "\n\n".join(f"[Document {i}]\n{doc.page_content.strip()}" for i, doc in enumerate(docs, 1))
+    original_tokens = count_tokens(unpacked, encoding_name) if unpacked else 0
+
+    blocks = []
+    used_tokens = 0
+    for _, members in _group_adjacent(docs):
+        text = members[0].page_content
+        for previous, doc in zip(members, members[1:]):
+            text = _merge_texts(text, doc.page_content, max_overlap, _known_overlap(previous, doc))
+        header = f"[Document {len(blocks) + 1}]"
+        if show_source and members[0].metadata.get("source"):
+            header += f" {members[0].metadata['source']}"
+        block = f"{header}\n{text.strip()}"
+        separator_tokens = 1 if blocks else 0
+
+        block_tokens = count_tokens(block, encoding_name)
+        if token_budget is not None and used_tokens + separator_tokens + block_tokens > token_budget:
+            remaining = token_budget - used_tokens - separator_tokens
+            if remaining >= MIN_PASSAGE_TOKENS:
+                # 为截断后追加的省略号留出1个token
+                block = truncate_to_tokens(block, remaining - 1, encoding_name)
+                blocks.append(block)
+                used_tokens += separator_tokens + count_tokens(block, encoding_name)
+            break
+        blocks.append(block)
+        used_tokens += separator_tokens + block_tokens
+
+    packed = "\n\n".join(blocks)
+    packed_tokens = count_tokens(packed, encoding_name) if packed else 0
+    stats = {
+        "chunks": len(docs),
+        "passages": len(blocks),
+        "original_tokens": original_tokens,
+        "packed_tokens": packed_tokens,
+        "saved_tokens": original_tokens - packed_tokens,
+    }
+    return packed, stats
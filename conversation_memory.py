@@ -0,0 +1,115 @@
+# conversation_memory.py - 有硬性token预算的对话记忆: 最近的对话原样保留，更早的对话增量折叠进滚动摘要
+
+from typing import Any, Dict, List
+
+from langchain.memory import ConversationSummaryBufferMemory
+from langchain_core.messages import AIMessage, BaseMessage, get_buffer_string
+
+# 对话记忆的默认token预算 (摘要 + 最近的对话)
+DEFAULT_MEMORY_TOKEN_BUDGET = 1500
+
+# 超出预算时把最近的对话裁剪到预算的这个比例以下，留出余量，避免之后每轮都调用一次摘要
+PRUNE_TARGET_RATIO = 0.75
+
+# 摘要最多占用预算的比例，超出时截断，保证预算是硬性的
+MAX_SUMMARY_RATIO = 0.4
+
+
+class SummarizingTokenBufferMemory(ConversationSummaryBufferMemory):
+    """带硬性token预算的摘要记忆
+
+    与ConversationSummaryBufferMemory相比:
+    - max_token_limit是摘要和最近对话的总预算，而不只是最近对话的长度
+    - 每条消息只计算一次token数，裁剪不再是消息数的平方复杂度
+    - 超出预算时一次裁剪到预算的PRUNE_TARGET_RATIO以下，并且按整轮对话裁剪(最近的对话从用户消息开始)，
+      只把新移出的消息和已有摘要交给LLM，增量更新摘要
+
+    用户画像已经在Agent的系统提示中，不放入记忆，避免每轮重复占用token。
+    """
+
+    max_token_limit: int = DEFAULT_MEMORY_TOKEN_BUDGET
+    summary_tokens: int = 0
+    summaries: int = 0
+
+    def _prefix_messages(self) -> List[BaseMessage]:
+        messages: List[BaseMessage] = []
+        if self.moving_summary_buffer:
+            messages.append(self.summary_message_cls(content=self.moving_summary_buffer))
+        return messages
+
+    def _format(self, buffer: List[BaseMessage]) -> Dict[str, Any]:
+        messages = self._prefix_messages() + buffer
+        if self.return_messages:
+            return {self.memory_key: messages}
+        return {self.memory_key: get_buffer_string(messages, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)}
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """返回摘要和最近的对话"""
+        return self._format(self.chat_memory.messages)
+
+    async def aload_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        return self._format(await self.chat_memory.aget_messages())
+
+    def _buffer_budget(self) -> int:
+        """最近对话可用的token数"""
+        return max(0, self.max_token_limit - self.summary_tokens)
+
+    def _prune_count(self, buffer: List[BaseMessage]) -> int:
+        """计算需要从最近对话开头移出的消息数，未超出预算时为0"""
+        counts = [self.llm.get_num_tokens_from_messages([message]) for message in buffer]
+        total = sum(counts)
+        if total <= self._buffer_budget():
+            return 0
+
+        # 摘要本身也占用预算，按摘要的上限预留
+        target = max(0, int(self.max_token_limit * PRUNE_TARGET_RATIO) - int(self.max_token_limit * MAX_SUMMARY_RATIO))
+        count = 0
+        while count < len(buffer) and total > target:
+            total -= counts[count]
+            count += 1
+        # 按整轮裁剪: 保留的对话不以AI消息开头
+        while count < len(buffer) and isinstance(buffer[count], AIMessage):
+            count += 1
+        return count
+
+    def _set_summary(self, summary: str):
+        """更新摘要，超出摘要上限时按词截断，直到不超过上限"""
+        limit = int(self.max_token_limit * MAX_SUMMARY_RATIO)
+        tokens = self.llm.get_num_tokens(summary)
+        words = summary.split()
+        while tokens > limit and words:
+            # 按比例估算保留的词数，估算偏大时至少再去掉一个词
+            keep = min(len(words) - 1, len(words) * limit // tokens)
+            words = words[:keep]
+            summary = " ".join(words)
+            tokens = self.llm.get_num_tokens(summary) if words else 0
+        self.moving_summary_buffer = summary
+        self.summary_tokens = tokens
+        self.summaries += 1
+
+    def prune(self) -> None:
+        """超出预算时把较早的对话折叠进摘要"""
+        buffer = self.chat_memory.messages
+        count = self._prune_count(buffer)
+        if count:
+            pruned = buffer[:count]
+            del buffer[:count]
+            self._set_summary(self.predict_new_summary(pruned, self.moving_summary_buffer))
+
+    async def aprune(self) -> None:
+        """prune的异步版本"""
+        buffer = self.chat_memory.messages
+        count = self._prune_count(buffer)
+        if count:
+            pruned = buffer[:count]
+            del buffer[:count]
+            self._set_summary(await self.apredict_new_summary(pruned, self.moving_summary_buffer))
+
+    def clear(self) -> None:
+        """清空对话和摘要"""
+        super().clear()
+        self.summary_tokens = 0
+
+    async def aclear(self) -> None:
+        await super().aclear()
+        self.summary_tokens = 0
@@ -0,0 +1,141 @@
+# embedding_backends.py - 可插拔的嵌入后端 (HuggingFace / ONNX Runtime)
+
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BACKENDS = ("huggingface", "onnx")
+
+# ONNX模型文件(包括量化后的模型)的本地缓存目录
+DEFAULT_ONNX_CACHE_DIR = os.path.join(".retriever_cache", "onnx")
+
+
+class OnnxSentenceEmbeddings(Embeddings):
+    """使用ONNX Runtime在CPU上运行sentence-transformers模型
+
+    与sentence-transformers的输出保持一致: 对最后一层隐藏状态做mean pooling后进行L2归一化。
+    模型文件从HuggingFace Hub上模型仓库的onnx/目录下载。
+    """
+
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, batch_size: int = 64,
+                 num_threads: Optional[int] = None, quantize: bool = False,
+                 max_length: int = 256, cache_dir: str = DEFAULT_ONNX_CACHE_DIR):
+        """初始化ONNX嵌入后端
+
+        Args:
+            model_name: HuggingFace Hub上的模型名称
+            batch_size: 每批嵌入的文本数
+            num_threads: ONNX Runtime的算子内线程数，默认由ONNX Runtime决定
+            quantize: 是否使用动态int8量化后的模型
+            max_length: 最大token数，超出部分截断
+            cache_dir: 量化模型的缓存目录
+        """
+        import onnxruntime as ort
+        from huggingface_hub import hf_hub_download
+        from tokenizers import Tokenizer
+
+        self.batch_size = batch_size
+
+        model_path = hf_hub_download(model_name, "onnx/model.onnx")
+        if quantize:
+            model_path = self._quantized_model(model_path, model_name, cache_dir)
+
+        self.tokenizer = Tokenizer.from_file(hf_hub_download(model_name, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    @staticmethod
+    def _quantized_model(model_path: str, model_name: str, cache_dir: str) -> str:
+        """对模型做动态int8量化，结果缓存在本地"""
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantized_path = os.path.join(cache_dir, model_name.replace("/", "__"), "model_int8.onnx")
+        if not os.path.exists(quantized_path):
+            os.makedirs(os.path.dirname(quantized_path), exist_ok=True)
+            tmp_path = f"{quantized_path}.tmp-{os.getpid()}"
+            quantize_dynamic(model_path, tmp_path, weight_type=QuantType.QInt8)
+            os.replace(tmp_path, quantized_path)
+        return quantized_path
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """嵌入一批文本"""
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        # mean pooling (忽略padding) + L2归一化
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """批量嵌入文档
+
+        按长度排序后再分批，减少每批中的padding，最后恢复原始顺序。
+        """
+        if not texts:
+            return []
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._embed_batch([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        """嵌入单条查询"""
+        return self._embed_batch([text])[0].tolist()
+
+
+def create_embeddings(backend: str = "huggingface", model_name: str = DEFAULT_MODEL_NAME,
+                      batch_size: int = 64, num_threads: Optional[int] = None,
+                      quantize: bool = False) -> Embeddings:
+    """创建嵌入后端
+
+    Args:
+        backend: "huggingface"(PyTorch) 或 "onnx"(ONNX Runtime)
+        model_name: 模型名称
+        batch_size: 每批嵌入的文本数
+        num_threads: ONNX Runtime会话的算子内线程数(仅onnx后端)
+        quantize: 是否使用int8量化(仅onnx后端)
+
+    Returns:
+        Embeddings: LangChain嵌入对象
+    """
+    if backend == "onnx":
+        return OnnxSentenceEmbeddings(model_name, batch_size=batch_size,
+                                      num_threads=num_threads, quantize=quantize)
+    if backend == "huggingface":
+        if quantize:
+            raise ValueError("int8 quantization is only supported by the onnx backend")
+        # torch的线程数是进程级设置，会影响同一进程中的其他模型，所以只在onnx后端按会话设置
+        if num_threads:
+            raise ValueError("num_threads is only supported by the onnx backend")
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=model_name, encode_kwargs={"batch_size": batch_size})
+    raise ValueError(f"Unknown embedding backend '{backend}', expected one of {EMBEDDING_BACKENDS}")
+
+
+def embedding_settings(backend: str, model_name: str = DEFAULT_MODEL_NAME,
+                       quantize: bool = False) -> Dict[str, Any]:
+    """影响向量结果的嵌入设置，用于计算索引缓存键
+
+    batch_size和线程数只影响速度，不影响向量，所以不包含在内。
+    """
+    return {"backend": backend, "model": model_name, "quantize": quantize}
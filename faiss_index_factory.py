@@ -0,0 +1,134 @@
+# faiss_index_factory.py - 可配置的FAISS索引类型 (Flat / IVF-PQ / HNSW) 及内存映射加载
+
+import math
+import os
+import pickle
+from typing import Any, Dict, List, Optional
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+INDEX_TYPES = ("flat", "ivfpq", "hnsw")
+
+# 各索引类型的默认构建参数
+DEFAULT_INDEX_PARAMS = {
+    "ivfpq": {"nlist": None, "pq_m": 48, "pq_bits": 8},  # nlist为None时按向量数自动选择
+    "hnsw": {"hnsw_m": 32, "ef_construction": 80},
+}
+
+# 默认检索参数: nprobe越大IVF召回越高，ef_search越大HNSW召回越高，但速度都会变慢
+DEFAULT_SEARCH_PARAMS = {"nprobe": 16, "ef_search": 64}
+
+# IVF每个聚类中心至少需要的训练向量数 (FAISS的经验值)
+MIN_TRAINING_POINTS_PER_CENTROID = 39
+
+
+def index_build_settings(index_type: str, index_params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """影响索引内容的构建设置，用于计算索引缓存键"""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+    params = dict(DEFAULT_INDEX_PARAMS.get(index_type, {}))
+    params.update(index_params or {})
+    return {"type": index_type, **params}
+
+
+def _build_index(vectors, index_type: str, params: Dict[str, Any]) -> faiss.Index:
+    """创建并(如有必要)训练FAISS索引"""
+    n_vectors, dim = vectors.shape
+
+    if index_type == "ivfpq":
+        nlist = params["nlist"] or max(1, int(4 * math.sqrt(n_vectors)))
+        nlist = min(nlist, n_vectors // MIN_TRAINING_POINTS_PER_CENTROID)
+        if nlist < 1 or n_vectors < 2 ** params["pq_bits"]:
+            # 向量太少，无法训练IVF-PQ，退回精确检索
+            print(f"Too few vectors ({n_vectors}) to train IVF-PQ, using a flat index instead")
+            return faiss.IndexFlatL2(dim)
+        quantizer = faiss.IndexFlatL2(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, params["pq_m"], params["pq_bits"])
+        index.train(vectors)
+        return index
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["hnsw_m"])
+        index.hnsw.efConstruction = params["ef_construction"]
+        return index
+
+    return faiss.IndexFlatL2(dim)
+
+
+def create_vectorstore(docs: List[Document], ids: List[str], embeddings, index_type: str = "flat",
+                       index_params: Optional[Dict[str, Any]] = None) -> FAISS:
+    """嵌入文档并构建指定类型的FAISS向量存储
+
+    Args:
+        docs: 文档分块
+        ids: 文档ID
+        embeddings: 嵌入模型
+        index_type: "flat"、"ivfpq" 或 "hnsw"
+        index_params: 构建参数，覆盖DEFAULT_INDEX_PARAMS中的默认值
+
+    Returns:
+        FAISS: LangChain向量存储
+    """
+    settings = index_build_settings(index_type, index_params)
+    texts = [doc.page_content for doc in docs]
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+
+    index = _build_index(vectors, index_type, settings)
+    vectorstore = FAISS(embeddings, index, InMemoryDocstore(), {})
+    vectorstore.add_embeddings(
+        zip(texts, vectors.tolist()),
+        metadatas=[doc.metadata for doc in docs],
+        ids=ids
+    )
+    return vectorstore
+
+
+def supports_remove(index: faiss.Index) -> bool:
+    """索引是否支持按ID删除向量，不支持时只能重建
+
+    LangChain的FAISS.delete删除后会把剩余向量的位置重新编号，只有Flat索引的remove_ids
+    会同样压缩位置。IVF索引删除后保留原来的ID，位置与index_to_docstore_id对不上；HNSW不支持删除。
+    """
+    return isinstance(faiss.downcast_index(index), faiss.IndexFlat)
+
+
+def apply_search_params(index: faiss.Index, search_params: Optional[Dict[str, Any]] = None):
+    """设置召回/速度相关的检索参数"""
+    params = dict(DEFAULT_SEARCH_PARAMS)
+    params.update(search_params or {})
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(params["nprobe"], index.nlist)
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = params["ef_search"]
+
+
+def load_vectorstore(folder_path: str, embeddings, mmap: bool = True) -> FAISS:
+    """加载由FAISS.save_local保存的向量存储
+
+    mmap为True时以内存映射方式读取: IVF索引的倒排表直接映射磁盘文件，
+    同一台机器上的多个工作进程共享这些页面，而不是各自持有一份拷贝。
+    Flat和HNSW索引不支持映射，向量仍会复制到每个进程的内存中。
+    映射后的索引是只读的，需要增量更新时应传入mmap=False。
+    """
+    index_path = os.path.join(folder_path, "index.faiss")
+    index = None
+    if mmap:
+        try:
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            print(f"Memory-mapped load failed, reading index into memory: {e}")
+        if index is not None and not isinstance(faiss.downcast_index(index), faiss.IndexIVF):
+            print("Memory mapping only shares the inverted lists of IVF indexes; "
+                  "this index is read into private memory in every process (use index_type='ivfpq' to share it)")
+    if index is None:
+        index = faiss.read_index(index_path)
+
+    # index.pkl由本工具写入，可以安全地反序列化
+    with open(os.path.join(folder_path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
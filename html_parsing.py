@@ -0,0 +1,255 @@
+# html_parsing.py - 只解析相关子树的HTML解析层 (LinkedIn职位卡片 / DuckDuckGo搜索结果)
+
+import re
+from typing import Dict, List, Optional
+
+import soupsieve
+from bs4 import BeautifulSoup, SoupStrainer
+
+# 优先使用基于C的lxml解析器，未安装时退回Python实现的html.parser
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+
+def _class_pattern(*names: str) -> "re.Pattern":
+    """匹配包含任一类名的class属性
+
+    解析阶段SoupStrainer拿到的是未拆分的class字符串，直接传类名无法匹配带多个类名的元素。
+    """
+    alternatives = "|".join(re.escape(name) for name in names)
+    return re.compile(rf"(^|\s)({alternatives})(\s|$)")
+
+
+# 只构建需要的子树，其余标签在解析时直接跳过
+LINKEDIN_CARD_STRAINER = SoupStrainer("div", class_=_class_pattern("job-search-card"))
+DUCKDUCKGO_RESULT_STRAINER = SoupStrainer("div", class_=_class_pattern("result"))
+LINKEDIN_DETAIL_STRAINER = SoupStrainer(
+    class_=_class_pattern("description__job-criteria-list", "show-more-less-html__markup")
+)
+
+# 预编译的CSS选择器
+LINKEDIN_SELECTORS = {
+    "title": soupsieve.compile("h3.base-search-card__title"),
+    "company": soupsieve.compile("a.hidden-nested-link"),
+    "location": soupsieve.compile("span.job-search-card__location"),
+    "link": soupsieve.compile("a.base-card__full-link"),
+}
+LINKEDIN_DETAIL_SELECTORS = {
+    "criteria": soupsieve.compile("li.description__job-criteria-item"),
+    "criteria_name": soupsieve.compile(".description__job-criteria-subheader"),
+    "criteria_value": soupsieve.compile(".description__job-criteria-text"),
+    "description": soupsieve.compile(".show-more-less-html__markup"),
+}
+DUCKDUCKGO_SELECTORS = {
+    "title": soupsieve.compile(".result__title"),
+    "link": soupsieve.compile(".result__url"),
+    "snippet": soupsieve.compile(".result__snippet"),
+}
+
+JOB_ID_PATTERNS = (re.compile(r"-(\d+)(?:\?|$)"), re.compile(r"currentJobId=(\d+)"))
+
+# 职位详情页"job criteria"列表中的字段名 -> 返回结果中的键
+LINKEDIN_CRITERIA_FIELDS = {
+    "seniority level": "seniority",
+    "employment type": "employment_type",
+    "job function": "job_function",
+    "industries": "industries",
+}
+
+# 职位描述摘要的最大字符数
+DESCRIPTION_SUMMARY_CHARS = 400
+
+# 提取正文时整体删除的标签
+BOILERPLATE_TAGS = [
+    "script", "style", "noscript", "template", "svg", "iframe", "form", "button",
+    "nav", "header", "footer", "aside",
+]
+# class/id/role中包含这些词的元素视为页面框架(导航、广告、Cookie提示等)
+BOILERPLATE_PATTERN = re.compile(
+    r"(^|[\s_-])(nav|navbar|menu|breadcrumbs?|header|footer|sidebar|cookies?|consent|banner|"
+    r"subscribe|newsletter|share|social|comments?|related|advert|ads|promo|popup|modal)($|[\s_-])",
+    re.IGNORECASE,
+)
+BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search", "dialog"}
+
+# 正文容器中至少要有这么多字符，才只使用该容器
+MIN_MAIN_TEXT_CHARS = 200
+
+
+def linkedin_job_id(urn: str, link: str) -> str:
+    """提取职位ID，用于去重
+
+    优先使用卡片上的data-entity-urn，其次从链接中提取，都没有时使用去掉查询参数的链接。
+    """
+    if urn.startswith("urn:li:jobPosting:"):
+        return urn.rsplit(":", 1)[1]
+    for pattern in JOB_ID_PATTERNS:
+        match = pattern.search(link)
+        if match:
+            return match.group(1)
+    return link.split("?", 1)[0]
+
+
+def parse_linkedin_job_cards(html: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
+    """解析LinkedIn搜索结果页中的职位卡片
+
+    Args:
+        html: 页面HTML
+        limit: 最多解析的卡片数
+
+    Returns:
+        List[Dict[str, str]]: 职位列表，每个职位包含job_id、title、company、location、link
+    """
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=LINKEDIN_CARD_STRAINER)
+
+    jobs = []
+    for card in soup.find_all("div", class_="job-search-card"):
+        fields = {name: selector.select_one(card) for name, selector in LINKEDIN_SELECTORS.items()}
+        if not all(fields.values()):
+            continue
+        link = fields["link"].get("href", "")
+        jobs.append({
+            "job_id": linkedin_job_id(card.get("data-entity-urn", ""), link),
+            "title": fields["title"].get_text(strip=True),
+            "company": fields["company"].get_text(strip=True),
+            "location": fields["location"].get_text(strip=True),
+            "link": link,
+        })
+        if limit is not None and len(jobs) >= limit:
+            break
+    return jobs
+
+
+def summarize_text(text: str, max_chars: int = DESCRIPTION_SUMMARY_CHARS) -> str:
+    """合并空白并截断到max_chars个字符，尽量在句子或单词边界处截断"""
+    text = re.sub(r"\s+", " ", text).strip()
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    sentence_end = max(cut.rfind(". "), cut.rfind("! "), cut.rfind("? "))
+    if sentence_end >= max_chars // 2:
+        return cut[:sentence_end + 1]
+    return cut.rsplit(" ", 1)[0] + "..."
+
+
+def parse_linkedin_job_detail(html: str, summary_chars: int = DESCRIPTION_SUMMARY_CHARS) -> Dict[str, str]:
+    """解析LinkedIn职位详情页 (jobs-guest/jobs/api/jobPosting/<id>)
+
+    Args:
+        html: 页面HTML
+        summary_chars: 职位描述摘要的最大字符数
+
+    Returns:
+        Dict[str, str]: 可能包含seniority、employment_type、job_function、industries、summary，
+            页面中没有的字段不出现在结果中
+    """
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=LINKEDIN_DETAIL_STRAINER)
+
+    details = {}
+    for item in LINKEDIN_DETAIL_SELECTORS["criteria"].select(soup):
+        name_elem = LINKEDIN_DETAIL_SELECTORS["criteria_name"].select_one(item)
+        value_elem = LINKEDIN_DETAIL_SELECTORS["criteria_value"].select_one(item)
+        if not name_elem or not value_elem:
+            continue
+        field = LINKEDIN_CRITERIA_FIELDS.get(name_elem.get_text(strip=True).lower())
+        if field:
+            details[field] = value_elem.get_text(strip=True)
+
+    description_elem = LINKEDIN_DETAIL_SELECTORS["description"].select_one(soup)
+    if description_elem:
+        summary = summarize_text(description_elem.get_text(" "), summary_chars)
+        if summary:
+            details["summary"] = summary
+    return details
+
+
+def _is_boilerplate(element) -> bool:
+    if element.attrs is None:
+        return False
+    if element.get("role", "").lower() in BOILERPLATE_ROLES:
+        return True
+    if element.name in ("html", "body", "main", "article"):
+        return False
+    classes = element.get("class") or []
+    if isinstance(classes, str):
+        classes = classes.split()
+    names = " ".join(classes) + " " + (element.get("id") or "")
+    return bool(BOILERPLATE_PATTERN.search(names))
+
+
+def extract_main_text(html: str, max_chars: Optional[int] = None) -> str:
+    """提取网页正文: 去掉脚本、导航、页眉页脚、广告等页面框架，优先使用<article>/<main>中的文本
+
+    Args:
+        html: 页面HTML
+        max_chars: 返回文本的最大字符数，为None时不限制
+
+    Returns:
+        str: 按行排列的正文文本，重复的行只保留一次
+    """
+    soup = BeautifulSoup(html, HTML_PARSER)
+    for element in soup(BOILERPLATE_TAGS):
+        element.decompose()
+    for element in soup.find_all(_is_boilerplate):
+        element.decompose()
+
+    root = soup.body or soup
+    for name in ("article", "main"):
+        candidate = soup.find(name)
+        if candidate is not None and len(candidate.get_text(strip=True)) >= MIN_MAIN_TEXT_CHARS:
+            root = candidate
+            break
+
+    lines = []
+    seen = set()
+    length = 0
+    for line in root.get_text(separator="\n").splitlines():
+        line = re.sub(r"\s+", " ", line).strip()
+        # 只有一个词的行大多是残留的菜单项或按钮文字
+        if not line or line in seen or (" " not in line and len(line) < 20):
+            continue
+        seen.add(line)
+        lines.append(line)
+        length += len(line) + 1
+        if max_chars is not None and length >= max_chars:
+            break
+
+    text = "\n".join(lines)
+    if max_chars is not None and len(text) > max_chars:
+        text = text[:max_chars].rsplit(" ", 1)[0] + "..."
+    return text
+
+
+def parse_duckduckgo_results(html: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
+    """解析DuckDuckGo HTML版搜索结果
+
+    Args:
+        html: 页面HTML
+        limit: 最多返回的结果数
+
+    Returns:
+        List[Dict[str, str]]: 结果列表，每个结果包含title、link、snippet
+    """
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=DUCKDUCKGO_RESULT_STRAINER)
+
+    results = []
+    for result_div in soup.find_all("div", class_="result"):
+        title_elem = DUCKDUCKGO_SELECTORS["title"].select_one(result_div)
+        link_elem = DUCKDUCKGO_SELECTORS["link"].select_one(result_div)
+        snippet_elem = DUCKDUCKGO_SELECTORS["snippet"].select_one(result_div)
+
+        link = link_elem.get_text(strip=True) if link_elem else "No Link"
+        if link and not link.startswith(("http://", "https://")):
+            link = "https://" + link
+
+        results.append({
+            "title": title_elem.get_text(strip=True) if title_elem else "No Title",
+            "link": link,
+            "snippet": snippet_elem.get_text(strip=True) if snippet_elem else "No Snippet",
+        })
+        if limit is not None and len(results) >= limit:
+            break
+    return results
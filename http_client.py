@@ -0,0 +1,245 @@
+# http_client.py - 共享的HTTP客户端: 连接池(keep-alive)、默认超时、带抖动退避的重试、按主机限速和请求统计
+
+import email.utils
+import random
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from typing import Dict, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 默认的(连接超时, 读取超时)，单位秒
+DEFAULT_TIMEOUT = (5.0, 10.0)
+
+# 这些状态码表示限流或服务端临时故障，按退避时间重试
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# 按主机的默认限速: 主机 -> (每秒请求数, 突发请求数)，未列出的主机不限速
+DEFAULT_RATE_LIMITS = {
+    "www.linkedin.com": (4.0, 8),
+    "html.duckduckgo.com": (2.0, 4),
+}
+
+
+class TokenBucket:
+    """令牌桶限速器，线程安全
+
+    令牌以rate个/秒的速度补充，最多积累burst个。令牌不足时预留下一个令牌并在锁外等待，
+    并发的请求按到达顺序依次放行。
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        """初始化令牌桶
+
+        Args:
+            rate: 每秒补充的令牌数
+            burst: 桶的容量，即允许的突发请求数
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: Optional[float] = None) -> float:
+        """取得一个令牌，必要时等待
+
+        Args:
+            deadline: time.monotonic()的截止时间，需要等到截止时间之后时不取令牌
+
+        Returns:
+            float: 等待的秒数，超过截止时间时返回-1
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return -1.0
+            self._tokens -= 1
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class HTTPClient:
+    """两个抓取工具共用的HTTP客户端
+
+    - 一个requests.Session，按主机复用连接，避免每次请求都重新进行TCP/TLS握手
+    - 没有指定超时的请求使用默认的连接/读取超时
+    - 429和5xx响应以及连接错误按指数退避重试，退避时间带随机抖动，响应带有Retry-After时按其等待
+    - 每个主机一个令牌桶限速
+    - 按主机统计请求数、状态码、重试次数、限速等待时间和延迟
+
+    请求通过Session.request发出，http_replay的录制/回放同样适用。
+    """
+
+    def __init__(self, timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT, max_retries: int = 2,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0, max_retry_after: float = 30.0,
+                 rate_limits: Optional[Dict[str, Tuple[float, int]]] = None,
+                 default_rate: Optional[Tuple[float, int]] = None, pool_size: int = 32):
+        """初始化客户端
+
+        Args:
+            timeout: 默认超时，单个数值或(连接超时, 读取超时)
+            max_retries: 最大重试次数(不含第一次请求)
+            backoff_base: 第一次重试的退避上限(秒)，之后每次翻倍
+            backoff_max: 退避时间的上限(秒)
+            max_retry_after: 服务器要求等待的时间超过该值时不再重试，直接返回响应
+            rate_limits: 按主机的限速 主机 -> (每秒请求数, 突发请求数)，为None时使用DEFAULT_RATE_LIMITS
+            default_rate: 其他主机的限速，为None时不限速
+            pool_size: 每个主机保留的最大连接数
+        """
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.rate_limits = DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits
+        self.default_rate = default_rate
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._buckets: Dict[str, Optional[TokenBucket]] = {}
+        self._stats: Dict[str, Counter] = {}
+        self._lock = threading.Lock()
+        self._random = random.Random()
+
+    def _bucket(self, host: str) -> Optional[TokenBucket]:
+        """返回主机的令牌桶，不限速的主机返回None"""
+        with self._lock:
+            if host not in self._buckets:
+                limit = self.rate_limits.get(host, self.default_rate)
+                self._buckets[host] = TokenBucket(*limit) if limit else None
+            return self._buckets[host]
+
+    def _record(self, host: str, **counts: float):
+        """累加主机的统计值"""
+        with self._lock:
+            self._stats.setdefault(host, Counter()).update(counts)
+
+    def _backoff(self, attempt: int, response: Optional[requests.Response] = None) -> Optional[float]:
+        """计算第attempt次重试前的等待时间，服务器要求等待过久时返回None"""
+        if response is not None and response.headers.get("Retry-After"):
+            delay = self._retry_after(response.headers["Retry-After"])
+            if delay is not None:
+                return delay if delay <= self.max_retry_after else None
+        # 全抖动: 在[0, min(上限, base * 2^attempt)]中随机取值，避免并发请求同时重试
+        with self._lock:
+            return self._random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    def _retry_after(value: str) -> Optional[float]:
+        """解析Retry-After (秒数或HTTP日期)"""
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def _attempt_timeout(self, timeout, deadline: Optional[float]):
+        """截止时间之前剩余的时间不足时，缩短本次请求的超时"""
+        if deadline is None:
+            return timeout
+        remaining = max(0.001, deadline - time.monotonic())
+        if isinstance(timeout, tuple):
+            return tuple(min(value, remaining) for value in timeout)
+        return min(timeout, remaining)
+
+    def request(self, method: str, url: str, timeout=None, deadline: Optional[float] = None,
+                **kwargs) -> requests.Response:
+        """发送请求，限速并在失败时重试
+
+        Args:
+            method: 请求方法
+            url: 请求URL
+            timeout: 本次请求的超时，为None时使用默认超时
+            deadline: time.monotonic()的截止时间，限速等待、重试和每次请求的超时都不会超过它
+            **kwargs: 传给Session.request的其他参数(headers、stream等)
+
+        Returns:
+            requests.Response: 最后一次请求的响应 (重试用尽后可能仍是429/5xx)
+
+        Raises:
+            requests.Timeout: 超时，或截止时间之前无法取得限速令牌
+            requests.ConnectionError: 重试用尽后仍然无法连接
+        """
+        host = urllib.parse.urlsplit(url).netloc.lower()
+        timeout = self.timeout if timeout is None else timeout
+        bucket = self._bucket(host)
+
+        for attempt in range(self.max_retries + 1):
+            if bucket is not None:
+                waited = bucket.acquire(deadline)
+                if waited < 0:
+                    self._record(host, rate_limited=1)
+                    raise requests.Timeout(f"Rate limit for {host} would exceed the deadline")
+                if waited:
+                    self._record(host, throttle_seconds=waited)
+
+            start = time.monotonic()
+            try:
+                response = self.session.request(method, url, timeout=self._attempt_timeout(timeout, deadline), **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(host, requests=1, errors=1, latency_seconds=time.monotonic() - start)
+                delay = self._backoff(attempt)
+                if attempt == self.max_retries or (deadline is not None and time.monotonic() + delay >= deadline):
+                    raise
+                self._record(host, retries=1)
+                time.sleep(delay)
+                continue
+
+            self._record(host, requests=1, latency_seconds=time.monotonic() - start,
+                         **{f"status_{response.status_code}": 1})
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            delay = self._backoff(attempt, response)
+            if delay is None or (deadline is not None and time.monotonic() + delay >= deadline):
+                return response
+            response.close()
+            self._record(host, retries=1)
+            time.sleep(delay)
+
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """发送GET请求，参数同request"""
+        return self.request("GET", url, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """按主机的请求统计，包含平均延迟(毫秒)"""
+        with self._lock:
+            snapshot = {host: dict(counts) for host, counts in self._stats.items()}
+        for counts in snapshot.values():
+            if counts.get("requests"):
+                counts["mean_latency_ms"] = round(counts["latency_seconds"] / counts["requests"] * 1000, 1)
+            counts["latency_seconds"] = round(counts.get("latency_seconds", 0.0), 3)
+            if "throttle_seconds" in counts:
+                counts["throttle_seconds"] = round(counts["throttle_seconds"], 3)
+        return snapshot
+
+    def close(self):
+        """关闭连接池"""
+        self.session.close()
+
+
+_default_client: Optional[HTTPClient] = None
+_default_lock = threading.Lock()
+
+
+def get_http_client() -> HTTPClient:
+    """返回进程内共享的HTTP客户端，首次调用时创建"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = HTTPClient()
+        return _default_client
@@ -0,0 +1,210 @@
+# job_store.py - 本地职位存储: SQLite + FTS5全文索引 + 按查询记录的抓取时间
+
+import json
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+DEFAULT_JOB_DB = os.path.join(".job_cache", "jobs.db")
+
+# 抓取结果的默认有效期(秒)
+DEFAULT_JOB_TTL = 6 * 3600
+
+# 删除过期记录的间隔(秒)
+PURGE_INTERVAL = 3600
+
+# 表示不限地点的输入
+ANY_LOCATION = {"", "anywhere", "any", "remote anywhere"}
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+def _fts_terms(text: str) -> str:
+    """把自由文本转换为FTS5查询: 每个词加引号，词之间为AND"""
+    words = re.findall(r"\w+", text.lower())
+    return " AND ".join(f'"{word}"' for word in words)
+
+
+class JobStore:
+    """抓取到的职位的本地存储
+
+    - jobs: 职位记录，last_seen为最近一次在抓取结果中出现的时间
+    - jobs_fts: title/company/location的FTS5全文索引
+    - queries / query_results: 每个(职位, 地点)查询的抓取时间和结果顺序
+    - job_details: 从职位详情页提取的信息，每个职位只抓取一次
+    """
+
+    def __init__(self, db_path: str = DEFAULT_JOB_DB, ttl: float = DEFAULT_JOB_TTL,
+                 purge_interval: float = PURGE_INTERVAL):
+        """初始化职位存储，打开时删除过期的记录
+
+        Args:
+            db_path: SQLite数据库文件路径
+            ttl: 抓取结果的有效期(秒)，过期后需要重新抓取
+            purge_interval: 由purge_if_due删除过期记录的间隔(秒)
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    company TEXT NOT NULL,
+                    location TEXT NOT NULL,
+                    link TEXT NOT NULL,
+                    last_seen REAL NOT NULL
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS jobs_fts USING fts5(
+                    job_id UNINDEXED, title, company, location
+                );
+                CREATE TABLE IF NOT EXISTS queries (
+                    title TEXT NOT NULL,
+                    location TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (title, location)
+                );
+                CREATE TABLE IF NOT EXISTS query_results (
+                    title TEXT NOT NULL,
+                    location TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    job_id TEXT NOT NULL,
+                    PRIMARY KEY (title, location, position)
+                );
+                CREATE TABLE IF NOT EXISTS job_details (
+                    job_id TEXT PRIMARY KEY,
+                    details TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                );
+            """)
+        self.purge_expired()
+
+    @contextmanager
+    def _connect(self):
+        """每次操作使用独立的连接，可以在多个线程中安全调用"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def is_fresh(self, job_title: str, location: str) -> bool:
+        """该查询是否在有效期内抓取过"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT fetched_at FROM queries WHERE title = ? AND location = ?",
+                (_normalize(job_title), _normalize(location))
+            ).fetchone()
+        return row is not None and time.time() - row["fetched_at"] <= self.ttl
+
+    def cached_results(self, job_title: str, location: str, limit: int) -> List[Dict[str, str]]:
+        """按上次抓取时的顺序返回该查询的结果"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT j.job_id, j.title, j.company, j.location, j.link FROM query_results r "
+                "JOIN jobs j ON j.job_id = r.job_id "
+                "WHERE r.title = ? AND r.location = ? ORDER BY r.position LIMIT ?",
+                (_normalize(job_title), _normalize(location), limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def search(self, job_title: str, location: str, limit: int) -> List[Dict[str, str]]:
+        """在有效期内出现过的职位中做全文检索，用于回答与之前查询重叠的新查询
+
+        Returns:
+            List[Dict[str, str]]: 按BM25相关性排序的职位
+        """
+        title_terms = _fts_terms(job_title)
+        if not title_terms:
+            return []
+        match = f"title : ({title_terms})"
+        if _normalize(location) not in ANY_LOCATION and _fts_terms(location):
+            match += f" AND location : ({_fts_terms(location)})"
+
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT j.job_id, j.title, j.company, j.location, j.link FROM jobs_fts f "
+                "JOIN jobs j ON j.job_id = f.job_id "
+                "WHERE jobs_fts MATCH ? AND j.last_seen >= ? ORDER BY bm25(jobs_fts) LIMIT ?",
+                (match, time.time() - self.ttl, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def save_results(self, job_title: str, location: str, jobs: List[Dict[str, str]]):
+        """保存一次抓取的结果，并更新该查询的抓取时间"""
+        now = time.time()
+        title_key, location_key = _normalize(job_title), _normalize(location)
+        with self._connect() as conn:
+            for job in jobs:
+                conn.execute(
+                    "INSERT INTO jobs (job_id, title, company, location, link, last_seen) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(job_id) DO UPDATE SET title = excluded.title, company = excluded.company, "
+                    "location = excluded.location, link = excluded.link, last_seen = excluded.last_seen",
+                    (job["job_id"], job["title"], job["company"], job["location"], job["link"], now)
+                )
+                conn.execute("DELETE FROM jobs_fts WHERE job_id = ?", (job["job_id"],))
+                conn.execute(
+                    "INSERT INTO jobs_fts (job_id, title, company, location) VALUES (?, ?, ?, ?)",
+                    (job["job_id"], job["title"], job["company"], job["location"])
+                )
+
+            conn.execute("DELETE FROM query_results WHERE title = ? AND location = ?", (title_key, location_key))
+            conn.executemany(
+                "INSERT INTO query_results (title, location, position, job_id) VALUES (?, ?, ?, ?)",
+                [(title_key, location_key, i, job["job_id"]) for i, job in enumerate(jobs)]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO queries (title, location, fetched_at) VALUES (?, ?, ?)",
+                (title_key, location_key, now)
+            )
+
+    def get_details(self, job_ids: List[str]) -> Dict[str, Dict[str, str]]:
+        """返回已抓取过详情的职位 {job_id: details}"""
+        if not job_ids:
+            return {}
+        placeholders = ", ".join("?" for _ in job_ids)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT job_id, details FROM job_details WHERE job_id IN ({placeholders})", list(job_ids)
+            ).fetchall()
+        return {row["job_id"]: json.loads(row["details"]) for row in rows}
+
+    def save_details(self, details: Dict[str, Dict[str, str]]):
+        """保存职位详情 {job_id: details}"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO job_details (job_id, details, fetched_at) VALUES (?, ?, ?)",
+                [(job_id, json.dumps(record), now) for job_id, record in details.items()]
+            )
+
+    def purge_if_due(self):
+        """距离上次删除过期记录超过purge_interval时再删除一次，供长时间运行的进程定期调用"""
+        if time.time() - self._last_purge >= self.purge_interval:
+            self.purge_expired()
+
+    def purge_expired(self, max_age: Optional[float] = None):
+        """删除超过max_age(默认为有效期)没有再出现的职位和查询记录"""
+        self._last_purge = time.time()
+        cutoff = self._last_purge - (max_age if max_age is not None else self.ttl)
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs_fts WHERE job_id IN (SELECT job_id FROM jobs WHERE last_seen < ?)", (cutoff,))
+            conn.execute("DELETE FROM job_details WHERE job_id IN (SELECT job_id FROM jobs WHERE last_seen < ?)", (cutoff,))
+            conn.execute("DELETE FROM jobs WHERE last_seen < ?", (cutoff,))
+            conn.execute(
+                "DELETE FROM query_results WHERE (title, location) IN "
+                "(SELECT title, location FROM queries WHERE fetched_at < ?)", (cutoff,)
+            )
+            conn.execute("DELETE FROM queries WHERE fetched_at < ?", (cutoff,))
@@ -1,86 +1,403 @@
 # linkedin_job_tool.py
 from langchain.tools import Tool
-import requests
-from bs4 import BeautifulSoup
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import Dict, List, Optional, Union, Tuple
 
+from html_parsing import parse_linkedin_job_cards, parse_linkedin_job_detail
+from bm25_index import reciprocal_rank_fusion
+from job_store import DEFAULT_JOB_DB, DEFAULT_JOB_TTL, JobStore
+from http_client import HTTPClient, get_http_client
+
 class LinkedInJobTool:
     """LinkedIn职位搜索工具类"""
     
-    def __init__(self):
-        """初始化LinkedIn职位搜索工具"""
+    # LinkedIn每页返回的职位数，用于计算分页偏移
+    PAGE_SIZE = 25
+    
+    # 搜索结果页和职位详情页(无需登录的guest接口)的路径
+    SEARCH_PATH = "/jobs/search"
+    DETAIL_PATH = "/jobs-guest/jobs/api/jobPosting/{job_id}"
+    
+    # 一次调用最多展开的(职位, 地点)组合数
+    MAX_FANOUT_QUERIES = 8
+    
+    def __init__(self, max_results: int = 10, pages: int = 3, max_workers: int = 4,
+                 store_path: Optional[str] = DEFAULT_JOB_DB, cache_ttl: float = DEFAULT_JOB_TTL,
+                 enrich_top: int = 0, detail_timeout: float = 5.0, base_url: str = "https://www.linkedin.com",
+                 http_client: Optional[HTTPClient] = None):
+        """初始化LinkedIn职位搜索工具
+        
+        Args:
+            max_results: 返回的最大职位数
+            pages: 并发抓取的搜索结果页数
+            max_workers: 抓取线程池的最大线程数
+            store_path: 本地职位存储(SQLite)路径，为None时每次都实时抓取
+            cache_ttl: 抓取结果的有效期(秒)
+            enrich_top: 抓取详情页(资历、雇佣类型、职位描述摘要)的职位数，为0时不抓取
+            detail_timeout: 详情抓取阶段的超时时间(秒)，超时未返回的职位不显示详情
+            base_url: LinkedIn站点地址，测试和压测时可指向本地的替代服务器
+            http_client: 发送请求的HTTP客户端，为None时使用进程内共享的客户端
+        """
+        self.max_results = max_results
+        self.pages = pages
+        self.max_workers = max_workers
+        self.store = JobStore(store_path, cache_ttl) if store_path else None
+        self.enrich_top = enrich_top
+        self.detail_timeout = detail_timeout
+        self.base_url = base_url.rstrip("/")
+        self.http = http_client or get_http_client()
+        # 没有本地存储时，职位详情只缓存在内存中
+        self._details: Dict[str, Dict[str, str]] = {}
+        
         # 创建Tool实例
         self.tool = Tool(
             name="LinkedIn Job Searcher",
             func=self._search_jobs_wrapper,
-            description="Search for jobs on LinkedIn. Input format: 'Job Title in Location', for example 'Solar Engineer in California'"
+            description=(
+                "Search for jobs on LinkedIn. Input format: 'Job Title in Location', for example "
+                "'Solar Engineer in California'. To search several roles or places in one call, separate them "
+                "with '|', for example 'Solar Engineer | Wind Technician in California | Texas', or pass JSON "
+                "like {\"titles\": [\"Solar Engineer\"], \"locations\": [\"California\", \"Texas\"]}. "
+                "All combinations are searched in parallel and returned as one merged, deduplicated list."
+            )
         )
     
     def _search_jobs_wrapper(self, query: str) -> str:
         """Tool接口的包装函数，处理输入query"""
         try:
             # 解析查询字符串
-            if " in " in query:
-                job_title, location = query.split(" in ", 1)
-            else:
-                job_title = query
-                location = "anywhere"
+            job_titles, locations = self.parse_fanout_query(query)
+            if not job_titles:
+                return "Please provide a job title to search for."
             
             # 调用主要搜索函数
-            return self.search_linkedin_jobs(job_title.strip(), location.strip())
+            if len(job_titles) == 1 and len(locations) == 1:
+                return self.search_linkedin_jobs(job_titles[0], locations[0])
+            return self.search_linkedin_jobs_many(job_titles, locations)
         except Exception as e:
             return f"Error searching for jobs: {str(e)}"
     
-    def search_linkedin_jobs(self, job_title: str, location: str) -> str:
-        """从LinkedIn搜索职位信息
+    def parse_fanout_query(self, query: str) -> Tuple[List[str], List[str]]:
+        """解析可能包含多个职位和地点的查询
+        
+        支持两种格式:
+        - "职位A | 职位B in 地点X | 地点Y"
+        - JSON: {"titles": [...], "locations": [...]}，也接受单个字符串形式的title/location
+        
+        Args:
+            query: 查询字符串
+            
+        Returns:
+            Tuple[List[str], List[str]]: (去重后的职位列表, 去重后的地点列表)，没有地点时为["anywhere"]
+        """
+        query = query.strip()
+        if query.startswith("{"):
+            data = json.loads(query)
+            titles = data.get("titles", data.get("title", []))
+            locations = data.get("locations", data.get("location", []))
+            titles = [titles] if isinstance(titles, str) else list(titles)
+            locations = [locations] if isinstance(locations, str) else list(locations)
+        else:
+            if " in " in query:
+                title_part, location_part = query.split(" in ", 1)
+            else:
+                title_part, location_part = query, ""
+            titles = title_part.split("|")
+            locations = location_part.split("|")
+        
+        def unique(values: List[str]) -> List[str]:
+            seen = set()
+            result = []
+            for value in values:
+                value = str(value).strip()
+                if value and value.lower() not in seen:
+                    seen.add(value.lower())
+                    result.append(value)
+            return result
+        
+        return unique(titles), unique(locations) or ["anywhere"]
+    
+    def _fetch_page(self, job_title: str, location: str, page: int) -> List[Dict[str, str]]:
+        """抓取并解析一页搜索结果
         
         Args:
             job_title: 职位名称
             location: 位置
+            page: 页码(从0开始)
             
         Returns:
-            str: 格式化的职位列表
+            List[Dict[str, str]]: 职位列表，每个职位包含job_id、title、company、location、link
         """
         # 构建LinkedIn搜索URL
-        url = f"https://www.linkedin.com/jobs/search?keywords={job_title.replace(' ', '%20')}&location={location.replace(' ', '%20')}&pageNum=0"
+        url = (
+            f"{self.base_url}{self.SEARCH_PATH}?keywords={job_title.replace(' ', '%20')}"
+            f"&location={location.replace(' ', '%20')}&pageNum={page}&start={page * self.PAGE_SIZE}"
+        )
         
         headers = {
             "User-Agent": "Mozilla/5.0",
             "Accept-Language": "en-US,en;q=0.5"
         }
-        response = requests.get(url, headers=headers)
+        response = self.http.get(url, headers=headers)
         
         if response.status_code != 200:
-            return f"Failed to fetch job listings (Status code: {response.status_code})."
+            raise RuntimeError(f"Failed to fetch job listings (Status code: {response.status_code}).")
         
-        # 解析HTML
-        soup = BeautifulSoup(response.text, "html.parser")
-        job_listings = soup.find_all("div", class_="job-search-card")
+        # 只解析职位卡片子树
+        jobs = parse_linkedin_job_cards(response.text)
+        return jobs
+    
+    def fetch_jobs(self, job_title: str, location: str) -> List[Dict[str, str]]:
+        """获取职位列表，优先使用本地存储，数据过期时才实时抓取
         
-        result_str = ""
-        count = 0  # 限制为前5个职位
-        for job in job_listings:
-            title_elem = job.find("h3", class_="base-search-card__title")
-            company_elem = job.find("a", class_="hidden-nested-link")
-            location_elem = job.find("span", class_="job-search-card__location")
-            anchor_tag = job.find("a", class_="base-card__full-link")
+        1. 同一查询在有效期内抓取过: 直接返回上次的结果
+        2. 有效期内的其他查询已经覆盖了足够多的匹配职位: 用全文索引回答
+        3. 否则实时抓取并写入存储
+        
+        Args:
+            job_title: 职位名称
+            location: 位置
+            
+        Returns:
+            List[Dict[str, str]]: 职位列表，最多max_results个
+        """
+        if self.store is not None:
+            if self.store.is_fresh(job_title, location):
+                return self.store.cached_results(job_title, location, self.max_results)
+            matches = self.store.search(job_title, location, self.max_results)
+            if len(matches) >= self.max_results:
+                return matches
+        
+        jobs = self._scrape_jobs(job_title, location)
+        if self.store is not None:
+            self.store.save_results(job_title, location, jobs)
+            self.store.purge_if_due()
+        return jobs
+    
+    def _scrape_jobs(self, job_title: str, location: str) -> List[Dict[str, str]]:
+        """并发抓取多页搜索结果，按职位ID去重
+        
+        Args:
+            job_title: 职位名称
+            location: 位置
+            
+        Returns:
+            List[Dict[str, str]]: 去重后的职位列表(保持页面顺序)，最多max_results个
+        """
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, self.pages)) as executor:
+            futures = [executor.submit(self._fetch_page, job_title, location, page) for page in range(self.pages)]
+        
+        jobs = []
+        seen = set()
+        errors = []
+        for future in futures:
+            try:
+                page_jobs = future.result()
+            except Exception as e:
+                errors.append(str(e))
+                continue
+            for job in page_jobs:
+                if job["job_id"] not in seen:
+                    seen.add(job["job_id"])
+                    jobs.append(job)
+        
+        # 所有页面都失败时才报告错误
+        if errors and len(errors) == len(futures):
+            raise RuntimeError(errors[0])
+        return jobs[:self.max_results]
+    
+    def _fetch_details(self, job: Dict[str, str]) -> Dict[str, str]:
+        """抓取并解析一个职位的详情页
+        
+        Args:
+            job: 职位
             
-            if title_elem and company_elem and location_elem and anchor_tag:
-                result_str += (
-                    f"Title: {title_elem.text.strip()}\n"
-                    f"Company: {company_elem.text.strip()}\n"
-                    f"Location: {location_elem.text.strip()}\n"
-                    f"Job Link: {anchor_tag['href']}\n\n"
-                )
-                count += 1
-                if count == 5:  # 限制为前5个职位
-                    break
+        Returns:
+            Dict[str, str]: 职位详情，可能包含seniority、employment_type、job_function、industries、summary
+        """
+        if job["job_id"].isdigit():
+            url = self.base_url + self.DETAIL_PATH.format(job_id=job["job_id"])
+        else:
+            url = job["link"]
         
+        headers = {
+            "User-Agent": "Mozilla/5.0",
+            "Accept-Language": "en-US,en;q=0.5"
+        }
+        response = self.http.get(url, headers=headers, deadline=time.monotonic() + self.detail_timeout)
+        
+        if response.status_code != 200:
+            raise RuntimeError(f"Failed to fetch job details (Status code: {response.status_code}).")
+        
+        return parse_linkedin_job_detail(response.text)
+    
+    def enrich_jobs(self, jobs: List[Dict[str, str]], top_n: Optional[int] = None) -> List[Dict[str, str]]:
+        """为前top_n个职位补充详情页中的信息
+        
+        已抓取过的职位直接使用缓存的详情，其余的并发抓取。整个阶段最多等待detail_timeout秒，
+        失败或超时的职位保持原样返回，之后的调用会再次尝试。
+        
+        Args:
+            jobs: 职位列表
+            top_n: 补充详情的职位数，默认为enrich_top
+            
+        Returns:
+            List[Dict[str, str]]: 职位列表，前top_n个职位合并了详情字段
+        """
+        top_n = self.enrich_top if top_n is None else top_n
+        targets = jobs[:top_n]
+        if not targets:
+            return jobs
+        
+        job_ids = [job["job_id"] for job in targets]
+        if self.store is not None:
+            details = self.store.get_details(job_ids)
+        else:
+            details = {job_id: self._details[job_id] for job_id in job_ids if job_id in self._details}
+        
+        missing = [job for job in targets if job["job_id"] not in details]
+        if missing:
+            executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing)))
+            futures = {executor.submit(self._fetch_details, job): job["job_id"] for job in missing}
+            done, _ = wait(futures, timeout=self.detail_timeout)
+            # 不等待超时的请求，它们会在requests的超时后自行结束
+            executor.shutdown(wait=False, cancel_futures=True)
+            
+            fetched = {}
+            for future in done:
+                try:
+                    fetched[futures[future]] = future.result()
+                except Exception:
+                    continue
+            if fetched:
+                if self.store is not None:
+                    self.store.save_details(fetched)
+                else:
+                    self._details.update(fetched)
+                details.update(fetched)
+        
+        return [
+            {**job, **details.get(job["job_id"], {})} if i < top_n else job
+            for i, job in enumerate(jobs)
+        ]
+    
+    def search_linkedin_jobs(self, job_title: str, location: str) -> str:
+        """从LinkedIn搜索职位信息
+        
+        Args:
+            job_title: 职位名称
+            location: 位置
+            
+        Returns:
+            str: 格式化的职位列表
+        """
+        try:
+            jobs = self.fetch_jobs(job_title, location)
+        except RuntimeError as e:
+            return str(e)
+        
+        if self.enrich_top:
+            jobs = self.enrich_jobs(jobs)
+        
+        result_str = self._format_jobs(jobs)
         if result_str:
-            return f"Found {count} job listings for '{job_title}' in '{location}':\n\n{result_str}"
+            return f"Found {len(jobs)} job listings for '{job_title}' in '{location}':\n\n{result_str}"
         else:
             return f"No job listings found for '{job_title}' in '{location}'."
     
+    def fetch_jobs_many(self, job_titles: List[str], locations: List[str]) -> List[Dict[str, str]]:
+        """并行搜索多个(职位, 地点)组合，合并、去重并排序
+        
+        每个组合的结果按倒数排名融合(RRF)打分: 在多个组合中都排名靠前的职位排在前面，
+        得分相同时按各组合结果轮流排列。
+        
+        Args:
+            job_titles: 职位名称列表
+            locations: 地点列表
+            
+        Returns:
+            List[Dict[str, str]]: 合并后的职位列表，最多max_results个
+        """
+        combos = [(title, location) for title in job_titles for location in locations][:self.MAX_FANOUT_QUERIES]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(combos))) as executor:
+            futures = [executor.submit(self.fetch_jobs, title, location) for title, location in combos]
+        
+        rankings = []
+        errors = []
+        for future in futures:
+            try:
+                rankings.append(future.result())
+            except Exception as e:
+                errors.append(str(e))
+        
+        # 所有组合都失败时才报告错误
+        if errors and len(errors) == len(futures):
+            raise RuntimeError(errors[0])
+        
+        jobs_by_id = {}
+        order = {}
+        for rank in range(max((len(ranking) for ranking in rankings), default=0)):
+            for ranking in rankings:
+                if rank < len(ranking):
+                    job = ranking[rank]
+                    jobs_by_id.setdefault(job["job_id"], job)
+                    order.setdefault(job["job_id"], len(order))
+        
+        fused = reciprocal_rank_fusion([[job["job_id"] for job in ranking] for ranking in rankings])
+        fused.sort(key=lambda item: (-item[1], order[item[0]]))
+        return [jobs_by_id[job_id] for job_id, _ in fused[:self.max_results]]
+    
+    def search_linkedin_jobs_many(self, job_titles: List[str], locations: List[str]) -> str:
+        """从LinkedIn并行搜索多个职位和地点
+        
+        Args:
+            job_titles: 职位名称列表
+            locations: 地点列表
+            
+        Returns:
+            str: 格式化的合并职位列表
+        """
+        try:
+            jobs = self.fetch_jobs_many(job_titles, locations)
+        except RuntimeError as e:
+            return str(e)
+        
+        if self.enrich_top:
+            jobs = self.enrich_jobs(jobs)
+        
+        titles = ", ".join(f"'{title}'" for title in job_titles)
+        places = ", ".join(f"'{location}'" for location in locations)
+        combos = len(job_titles) * len(locations)
+        note = ""
+        if combos > self.MAX_FANOUT_QUERIES:
+            note = f"(Only the first {self.MAX_FANOUT_QUERIES} of {combos} title/location combinations were searched.)\n\n"
+        
+        result_str = self._format_jobs(jobs)
+        if result_str:
+            return f"Found {len(jobs)} job listings for {titles} in {places}:\n\n{note}{result_str}"
+        else:
+            return f"{note}No job listings found for {titles} in {places}."
+    
+    def _format_jobs(self, jobs: List[Dict[str, str]]) -> str:
+        """格式化职位列表"""
+        result_str = ""
+        for job in jobs:
+            result_str += (
+                f"Title: {job['title']}\n"
+                f"Company: {job['company']}\n"
+                f"Location: {job['location']}\n"
+            )
+            if job.get("seniority"):
+                result_str += f"Seniority: {job['seniority']}\n"
+            if job.get("employment_type"):
+                result_str += f"Employment Type: {job['employment_type']}\n"
+            if job.get("summary"):
+                result_str += f"Summary: {job['summary']}\n"
+            result_str += f"Job Link: {job['link']}\n\n"
+        return result_str
+    
     def get_tool(self) -> Tool:
         """获取LangChain工具实例
         
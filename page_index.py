@@ -0,0 +1,114 @@
+# page_index.py - 抓取网页的临时向量索引: 分块、嵌入(按URL缓存)并选出与查询最相关的段落
+
+import hashlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+
+from result_cache import LRUTTLCache
+
+# 网页段落的分块设置 (网页正文按行排列，优先在段落和句子处切分)
+PASSAGE_CHUNK_SIZE = 500
+PASSAGE_CHUNK_OVERLAP = 50
+PASSAGE_SEPARATORS = ["\n\n", "\n", ". ", " ", ""]
+
+
+class PageIndex:
+    """每次搜索临时构建的段落索引
+
+    每个URL的分块和向量按正文的哈希缓存，同一页面内容不变时不会重新嵌入。
+    索引本身只是本次调用的向量矩阵，规模只有几十到几百个段落，直接做精确的余弦相似度检索。
+    """
+
+    def __init__(self, embeddings, cache_size: int = 64, cache_ttl: Optional[float] = None,
+                 chunk_size: int = PASSAGE_CHUNK_SIZE, chunk_overlap: int = PASSAGE_CHUNK_OVERLAP):
+        """初始化段落索引
+
+        Args:
+            embeddings: LangChain嵌入对象
+            cache_size: 缓存向量的页面数
+            cache_ttl: 页面向量的有效期(秒)，为None时不过期
+            chunk_size: 分块大小
+            chunk_overlap: 分块重叠
+        """
+        self.embeddings = embeddings
+        self.chunk_overlap = chunk_overlap
+        self.page_cache = LRUTTLCache(cache_size, cache_ttl)
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            separators=PASSAGE_SEPARATORS,
+        )
+
+    def _page_vectors(self, pages: Sequence[Dict[str, str]]) -> List[Tuple[List[str], np.ndarray]]:
+        """返回每个页面的分块和单位化的向量，未缓存的页面一起批量嵌入"""
+        entries: List[Optional[Tuple[List[str], np.ndarray]]] = []
+        pending = []
+        for i, page in enumerate(pages):
+            digest = hashlib.sha1(page["content"].encode("utf-8")).hexdigest()
+            cached = self.page_cache.get(page["link"])
+            if cached is not None and cached[0] == digest:
+                entries.append(cached[1])
+                continue
+            entries.append(None)
+            pending.append((i, digest, self.splitter.split_text(page["content"])))
+
+        texts = [chunk for _, _, chunks in pending for chunk in chunks]
+        vectors = np.zeros((0, 0), dtype=np.float32)
+        if texts:
+            vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        offset = 0
+        for i, digest, chunks in pending:
+            entry = (chunks, vectors[offset:offset + len(chunks)])
+            offset += len(chunks)
+            self.page_cache.set(pages[i]["link"], (digest, entry))
+            entries[i] = entry
+        return entries
+
+    def top_passages(self, query: str, pages: Sequence[Dict[str, str]], k: int = 6) -> List[Document]:
+        """检索与查询最相关的k个段落
+
+        Args:
+            query: 查询
+            pages: 页面列表，每个页面包含link、title和content(正文)
+            k: 返回的段落数
+
+        Returns:
+            List[Document]: 按相关性排序的段落，metadata包含source(URL)、title、chunk(页内序号)和score
+        """
+        pages = [page for page in pages if page.get("content")]
+        if not pages:
+            return []
+
+        docs = []
+        matrices = []
+        for page, (chunks, vectors) in zip(pages, self._page_vectors(pages)):
+            if not chunks:
+                continue
+            docs.extend(
+                Document(page_content=chunk, metadata={"source": page["link"], "title": page.get("title", ""), "chunk": i})
+                for i, chunk in enumerate(chunks)
+            )
+            matrices.append(vectors)
+        if not docs:
+            return []
+
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        query_vector /= max(float(np.linalg.norm(query_vector)), 1e-12)
+        scores = np.vstack(matrices) @ query_vector
+
+        top = np.argsort(-scores)[:k]
+        results = []
+        for index in top:
+            doc = docs[int(index)]
+            doc.metadata["score"] = float(scores[index])
+            results.append(doc)
+        return results
+
+    def cache_stats(self) -> Dict[str, int]:
+        """页面向量缓存的命中统计"""
+        return self.page_cache.stats()
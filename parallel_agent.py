@@ -0,0 +1,155 @@
+# parallel_agent.py - 并行工具调用: 模型在一步中可以请求多个互不依赖的工具调用，并发执行后合并观察结果
+
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Iterator, List, Optional, Tuple, Union
+
+from langchain.agents import AgentExecutor
+from langchain.agents.conversational.base import ConversationalAgent
+from langchain.agents.conversational.output_parser import ConvoOutputParser
+from langchain_core.agents import AgentAction, AgentFinish, AgentStep
+from langchain_core.exceptions import OutputParserException
+
+# 一步中最多并发执行的工具调用数
+MAX_PARALLEL_ACTIONS = 4
+
+# 一次输出中的每个Action / Action Input对，Action Input延续到下一个Action或输出结尾
+ACTION_PATTERN = re.compile(r"Action\s*:[ \t]*(.*?)\s*Action\s*Input\s*:[ \t]*(.*?)(?=\s*Action\s*:|\Z)", re.DOTALL)
+
+PARALLEL_FORMAT_INSTRUCTIONS = f"""To use a tool, please use the following format:
+
+```
+Thought: Do I need to use a tool? Yes
+Action: the action to take, should be one of [{{tool_names}}]
+Action Input: the input to the action
+Observation: the result of the action
+```
+
+If you need information from several tools and their inputs do not depend on each other's results, request them in the same step: write one Action / Action Input pair per tool call (at most {MAX_PARALLEL_ACTIONS}) before the Observation. The calls run at the same time and all results are returned together:
+
+```
+Thought: Do I need to use a tool? Yes
+Action: the first action, one of [{{tool_names}}]
+Action Input: the input to the first action
+Action: the second action, one of [{{tool_names}}]
+Action Input: the input to the second action
+Observation: the results of all actions
+```
+
+When you have a response to say to the Human, or if you do not need to use a tool, you MUST use the format:
+
+```
+Thought: Do I need to use a tool? No
+{{ai_prefix}}: [your response here]
+```"""
+
+
+class MultiActionConvoOutputParser(ConvoOutputParser):
+    """ConvoOutputParser的多动作版本
+
+    输出中只有一个Action时与原解析器的结果相同；有多个Action时返回AgentAction列表，
+    每个动作的log都是完整的输出，用于在scratchpad中把同一步的观察结果合并显示。
+    """
+
+    max_actions: int = MAX_PARALLEL_ACTIONS
+
+    def parse(self, text: str) -> Union[List[AgentAction], AgentAction, AgentFinish]:
+        if f"{self.ai_prefix}:" in text:
+            return AgentFinish({"output": text.split(f"{self.ai_prefix}:")[-1].strip()}, text)
+
+        actions = []
+        seen = set()
+        for match in ACTION_PATTERN.finditer(text):
+            tool = match.group(1).strip()
+            tool_input = match.group(2).strip(" ").strip('"')
+            # 重复的调用只执行一次
+            if (tool, tool_input) in seen:
+                continue
+            seen.add((tool, tool_input))
+            actions.append(AgentAction(tool, tool_input, text))
+        if not actions:
+            raise OutputParserException(f"Could not parse LLM output: `{text}`")
+        if len(actions) == 1:
+            return actions[0]
+        return actions[:self.max_actions]
+
+    @property
+    def _type(self) -> str:
+        return "conversational_multi_action"
+
+
+class ParallelConversationalAgent(ConversationalAgent):
+    """可以在一步中请求多个工具调用的CONVERSATIONAL_REACT_DESCRIPTION Agent"""
+
+    @classmethod
+    def _get_default_output_parser(cls, ai_prefix: str = "AI", **kwargs: Any) -> MultiActionConvoOutputParser:
+        return MultiActionConvoOutputParser(ai_prefix=ai_prefix)
+
+    def _construct_scratchpad(self, intermediate_steps: List[Tuple[AgentAction, str]]) -> str:
+        """同一次输出产生的多个动作只写一次思考过程，后面依次列出每个工具的观察结果"""
+        thoughts = ""
+        i = 0
+        while i < len(intermediate_steps):
+            action, observation = intermediate_steps[i]
+            group = [(action, observation)]
+            while (i + len(group) < len(intermediate_steps)
+                   and intermediate_steps[i + len(group)][0].log == action.log
+                   and action.tool != "_Exception"):
+                group.append(intermediate_steps[i + len(group)])
+            i += len(group)
+
+            thoughts += action.log
+            if len(group) == 1:
+                thoughts += f"\n{self.observation_prefix}{observation}\n{self.llm_prefix}"
+            else:
+                merged = "\n\n".join(
+                    f"[{step_action.tool}: {step_action.tool_input}]\n{step_observation}"
+                    for step_action, step_observation in group
+                )
+                thoughts += f"\n{self.observation_prefix}\n{merged}\n{self.llm_prefix}"
+        return thoughts
+
+
+class _PendingStep:
+    """已提交到线程池、尚未完成的工具调用"""
+
+    def __init__(self, future: Future):
+        self.future = future
+
+
+_tool_pool: Optional[ThreadPoolExecutor] = None
+_tool_pool_lock = threading.Lock()
+
+
+def _get_tool_pool() -> ThreadPoolExecutor:
+    """所有Agent共用的工具线程池"""
+    global _tool_pool
+    with _tool_pool_lock:
+        if _tool_pool is None:
+            _tool_pool = ThreadPoolExecutor(max_workers=2 * MAX_PARALLEL_ACTIONS, thread_name_prefix="agent-tool")
+        return _tool_pool
+
+
+class ParallelAgentExecutor(AgentExecutor):
+    """并发执行同一步中所有工具调用的AgentExecutor
+
+    异步执行(ainvoke)时AgentExecutor本身已经用asyncio.gather并发执行同一步的动作；
+    这里让同步执行(run/invoke)也在线程池中并发执行，按请求的顺序返回观察结果。
+    """
+
+    def _perform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None):
+        return _PendingStep(_get_tool_pool().submit(
+            super()._perform_agent_action, name_to_tool_map, color_mapping, agent_action, run_manager
+        ))
+
+    def _iter_next_step(self, *args: Any, **kwargs: Any) -> Iterator[Union[AgentFinish, AgentAction, AgentStep]]:
+        # 基类依次调用_perform_agent_action，这里先提交所有动作，全部提交后再等待结果
+        pending = []
+        for item in super()._iter_next_step(*args, **kwargs):
+            if isinstance(item, _PendingStep):
+                pending.append(item.future)
+            else:
+                yield item
+        for future in pending:
+            yield future.result()
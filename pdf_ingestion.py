@@ -0,0 +1,86 @@
+# pdf_ingestion.py - PDF解析与分块流水线(支持多进程并行)
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import List, Optional, Sequence
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+# 页数少于该值时直接串行处理，进程池的启动开销不划算
+MIN_PAGES_FOR_PARALLEL = 8
+
+# 每个工作进程平均分到的批次数，批次越多负载越均衡
+BATCHES_PER_WORKER = 4
+
+
+def _chunk_page_range(pdf_path: str, page_numbers: Sequence[int], chunk_size: int,
+                      chunk_overlap: int, separators: List[str]) -> List[Document]:
+    """提取并分块指定页 (在工作进程中运行，必须是模块级函数)
+
+    Args:
+        pdf_path: PDF文件路径
+        page_numbers: 页码列表(从0开始)
+        chunk_size: 分块大小
+        chunk_overlap: 分块重叠
+        separators: 分隔符列表
+
+    Returns:
+        List[Document]: 分块结果，metadata中带有页码和页内起始位置
+    """
+    reader = PdfReader(pdf_path)
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=separators,
+        add_start_index=True
+    )
+
+    chunks = []
+    for page_number in page_numbers:
+        text = reader.pages[page_number].extract_text() or ""
+        if text.strip():
+            chunks.extend(text_splitter.create_documents([text], metadatas=[{"page": page_number}]))
+    return chunks
+
+
+def load_pdf_chunks(pdf_path: str, chunk_size: int, chunk_overlap: int, separators: List[str],
+                    max_workers: Optional[int] = None) -> List[Document]:
+    """解析PDF并分块，页数较多时使用进程池并行处理
+
+    每一页独立分块，所以并行与串行的结果完全一致：批次按页码连续划分，
+    结果按批次顺序拼接。
+
+    Args:
+        pdf_path: PDF文件路径
+        chunk_size: 分块大小
+        chunk_overlap: 分块重叠
+        separators: 分隔符列表
+        max_workers: 工作进程数，默认为CPU核数; 为1时串行处理
+
+    Returns:
+        List[Document]: 分块结果，metadata包含page(页码)、start_index和chunk(文件内序号)
+    """
+    page_count = len(PdfReader(pdf_path).pages)
+    max_workers = max_workers or os.cpu_count() or 1
+
+    if max_workers <= 1 or page_count < MIN_PAGES_FOR_PARALLEL:
+        chunks = _chunk_page_range(pdf_path, range(page_count), chunk_size, chunk_overlap, separators)
+    else:
+        # 按连续页码划分批次
+        batch_count = min(page_count, max_workers * BATCHES_PER_WORKER)
+        batch_size = -(-page_count // batch_count)
+        batches = [range(start, min(start + batch_size, page_count)) for start in range(0, page_count, batch_size)]
+
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+            worker = partial(_chunk_page_range, pdf_path, chunk_size=chunk_size,
+                             chunk_overlap=chunk_overlap, separators=separators)
+            results = executor.map(worker, batches)
+            chunks = [chunk for batch in results for chunk in batch]
+
+    # 记录分块在文件内的顺序，便于之后合并相邻分块
+    for i, chunk in enumerate(chunks):
+        chunk.metadata["chunk"] = i
+    return chunks
@@ -0,0 +1,221 @@
+# result_cache.py - 带LRU/TTL淘汰的两级结果缓存 (内存 + 可选的SQLite磁盘层)
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+# 磁盘层默认最多保存的条目数(整张表，包括所有namespace)
+DEFAULT_MAX_DISK_ENTRIES = 10000
+
+# 每写入多少次检查一次磁盘层的过期条目和总条目数
+DISK_PRUNE_INTERVAL = 64
+
+
+def normalize_query(query: str) -> str:
+    """规范化查询文本: 小写、合并空白、去掉首尾标点"""
+    query = re.sub(r"\s+", " ", query.lower()).strip()
+    return query.strip(" \t\"'`.,;:!?")
+
+
+class LRUTTLCache:
+    """线程安全的LRU缓存，支持过期时间和可选的共享磁盘层
+
+    - 内存层按LRU淘汰，条目数不超过max_entries
+    - 磁盘层是SQLite文件，可在多个会话/进程之间共享，值以JSON保存；
+      过期条目定期删除，总条目数超过max_disk_entries时删除最久未访问的条目
+    - namespace用于整体失效: 切换到新的namespace时清空内存层，只读写新namespace的条目；
+      其他namespace的条目保留(其他进程可能仍在使用)，不再访问后由TTL/LRU淘汰
+    - get_or_compute合并同一个键的并发未命中，只计算一次
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: Optional[float] = None,
+                 disk_path: Optional[str] = None, namespace: str = "default",
+                 table: str = "cache", max_disk_entries: Optional[int] = DEFAULT_MAX_DISK_ENTRIES):
+        """初始化缓存
+
+        Args:
+            max_entries: 内存层最大条目数
+            ttl: 条目有效期(秒)，为None时不过期
+            disk_path: SQLite磁盘层文件路径，为None时只使用内存层
+            namespace: 初始命名空间
+            table: 磁盘层表名，多个缓存可以共用同一个数据库文件(同一张表的缓存应使用相同的TTL)
+            max_disk_entries: 磁盘层表的最大条目数，为None时不限制
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.namespace = namespace
+        self.table = table
+        self.max_disk_entries = max_disk_entries
+        self._writes = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+        self._db = None
+        if disk_path is not None:
+            if os.path.dirname(disk_path):
+                os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL DEFAULT 0, PRIMARY KEY (namespace, key))"
+            )
+            # 兼容没有accessed列的旧缓存文件
+            columns = {row[1] for row in self._db.execute(f"PRAGMA table_info({table})")}
+            if "accessed" not in columns:
+                self._db.execute(f"ALTER TABLE {table} ADD COLUMN accessed REAL NOT NULL DEFAULT 0")
+                self._db.execute(f"UPDATE {table} SET accessed = created")
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed)")
+            self._prune_disk()
+            self._db.commit()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """读取缓存，先查内存层再查磁盘层"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(created):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    f"SELECT value, created FROM {self.table} WHERE namespace = ? AND key = ?",
+                    (self.namespace, key)
+                ).fetchone()
+                if row is not None and not self._expired(row[1]):
+                    value = json.loads(row[0])
+                    self._db.execute(
+                        f"UPDATE {self.table} SET accessed = ? WHERE namespace = ? AND key = ?",
+                        (time.time(), self.namespace, key)
+                    )
+                    self._db.commit()
+                    self._store(key, value, row[1])
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return default
+
+    def set(self, key: str, value: Any):
+        """写入缓存 (磁盘层要求值可以JSON序列化)"""
+        created = time.time()
+        with self._lock:
+            self._store(key, value, created)
+            if self._db is not None:
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (namespace, key, value, created, accessed) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, key, json.dumps(value), created, created)
+                )
+                self._writes += 1
+                if self._writes % DISK_PRUNE_INTERVAL == 0:
+                    self._prune_disk()
+                self._db.commit()
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any],
+                       cacheable: Optional[Callable[[Any], bool]] = None) -> Any:
+        """读取缓存，未命中时调用compute计算并写入缓存
+
+        同一个键正在计算时，其他线程等待并共享这次计算的结果(或异常)，不会重复计算。
+        计算失败，或cacheable对结果返回False时不写入缓存，下一次调用会重新计算。
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            if cacheable is None or cacheable(value):
+                self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _store(self, key: str, value: Any, created: float):
+        """写入内存层并按LRU淘汰 (调用方需持有锁)"""
+        self._entries[key] = (value, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _prune_disk(self):
+        """删除磁盘层中过期的条目，并按最近访问时间淘汰超出max_disk_entries的条目 (调用方需持有锁并提交)"""
+        if self.ttl is not None:
+            self._db.execute(f"DELETE FROM {self.table} WHERE created < ?", (time.time() - self.ttl,))
+        if self.max_disk_entries is not None:
+            count = self._db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            if count > self.max_disk_entries:
+                self._db.execute(
+                    f"DELETE FROM {self.table} WHERE rowid IN "
+                    f"(SELECT rowid FROM {self.table} ORDER BY accessed LIMIT ?)",
+                    (count - self.max_disk_entries,)
+                )
+
+    def set_namespace(self, namespace: str):
+        """切换命名空间; 命名空间变化时丢弃内存层的旧条目(例如索引重建后)
+
+        磁盘层中其他命名空间的条目不删除: 共用同一个文件的其他进程可能仍在使用旧的命名空间。
+        """
+        with self._lock:
+            if namespace == self.namespace:
+                return
+            self.namespace = namespace
+            self._entries.clear()
+
+    def clear(self):
+        """清空当前命名空间的所有条目"""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute(f"DELETE FROM {self.table} WHERE namespace = ?", (self.namespace,))
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """返回命中/未命中计数"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "coalesced": self.coalesced,
+                "size": len(self._entries),
+            }
@@ -1,14 +1,41 @@
 # retriever_tool.py - 修改版，移除历史感知功能
 
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from filelock import FileLock
 from langchain.tools import BaseTool
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from typing import List, Dict, Any, Optional, Type
+from typing import List, Dict, Any, Optional, Tuple, Type
 from pydantic import Field
 
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from context_packer import pack_documents
+from embedding_backends import create_embeddings, embedding_settings
+from faiss_index_factory import (
+    apply_search_params,
+    create_vectorstore,
+    index_build_settings,
+    load_vectorstore,
+    supports_remove,
+)
+from pdf_ingestion import load_pdf_chunks
+from result_cache import LRUTTLCache, normalize_query
+
+# 分块与嵌入设置 (这些设置参与索引缓存键的计算，修改后会自动重建索引)
+CHUNK_SIZE = 256
+CHUNK_OVERLAP = 50
+SEPARATORS = ["\n\n", "\n", " ", ""]
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# 索引缓存目录; 缓存格式变化时递增版本号
+DEFAULT_CACHE_DIR = ".retriever_cache"
+INDEX_CACHE_VERSION = 4
+
 class HistoryAwareRetrieverTool(BaseTool):
     name: str = "DocumentRetriever"  # 添加类型注解
     description: str = "Retrieves relevant information from the clean energy knowledge base based on the question."  # 修改描述
@@ -16,49 +43,345 @@ class HistoryAwareRetrieverTool(BaseTool):
     # 使用 Field 定义这些属性为非必需，或者在初始化时传递
     llm: Any = Field(default=None, exclude=True)  # exclude=True 表示这个不会被序列化
     base_retriever: Any = Field(default=None, exclude=True)
+    ingest_workers: Optional[int] = None
+    embedding_backend: str = "huggingface"
+    embedding_batch_size: int = 64
+    embedding_threads: Optional[int] = None
+    quantize_embeddings: bool = False
+    embeddings: Any = Field(default=None, exclude=True)
+    vectorstore: Any = Field(default=None, exclude=True)
+    k: int = 5
+    index_fingerprint: str = ""
+    embedding_cache: Any = Field(default=None, exclude=True)
+    result_cache: Any = Field(default=None, exclude=True)
+    bm25_index: Any = Field(default=None, exclude=True)
+    hybrid: bool = True
+    rrf_k: int = 60
+    index_type: str = "flat"
+    index_params: Optional[Dict[str, Any]] = None
+    search_params: Optional[Dict[str, Any]] = None
+    mmap_index: bool = True
+    max_async_workers: int = 4
+    executor: Any = Field(default=None, exclude=True)
+    token_budget: Optional[int] = 1000
 
-    def __init__(self, llm, pdf_path: str, k: int = 5):
+    def __init__(self, llm, pdf_path: str, k: int = 5, cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+                 ingest_workers: Optional[int] = None, embedding_backend: str = "huggingface",
+                 embedding_batch_size: int = 64, embedding_threads: Optional[int] = None,
+                 quantize_embeddings: bool = False, query_cache_size: int = 256,
+                 query_cache_ttl: Optional[float] = None, query_cache_path: Optional[str] = None,
+                 hybrid: bool = True, rrf_k: int = 60, index_type: str = "flat",
+                 index_params: Optional[Dict[str, Any]] = None,
+                 search_params: Optional[Dict[str, Any]] = None, mmap_index: bool = True,
+                 max_async_workers: int = 4, token_budget: Optional[int] = 1000):
         """初始化检索工具
         
         Args:
             llm: 语言模型（此参数保留但不再使用）
-            pdf_path: PDF文档路径
+            pdf_path: PDF文档路径，或包含多个PDF文档的知识库目录
             k: 返回的文档数量
+            cache_dir: 索引缓存目录，为None时不使用缓存
+            ingest_workers: 解析PDF的工作进程数，默认为CPU核数
+            embedding_backend: 嵌入后端，"huggingface"(PyTorch) 或 "onnx"(ONNX Runtime)
+            embedding_batch_size: 每批嵌入的文本数
+            embedding_threads: 嵌入使用的CPU线程数(仅onnx后端)
+            quantize_embeddings: 是否使用int8量化模型(仅onnx后端)
+            query_cache_size: 查询嵌入和检索结果缓存的最大条目数
+            query_cache_ttl: 缓存有效期(秒)，为None时不过期
+            query_cache_path: 共享的SQLite磁盘缓存路径，为None时只使用内存缓存
+            hybrid: 是否将BM25词法检索与向量检索的结果融合
+            rrf_k: 倒数排名融合的平滑常数
+            index_type: FAISS索引类型，"flat"(精确)、"ivfpq" 或 "hnsw"
+            index_params: 索引构建参数(如nlist、pq_m、hnsw_m)
+            search_params: 检索参数(如nprobe、ef_search)，用于权衡召回率和速度
+            mmap_index: 是否以内存映射方式加载缓存的索引，让多个工作进程共享IVF索引倒排表的内存页
+                (flat和hnsw索引不支持映射，每个进程各自持有一份向量)
+            max_async_workers: 异步检索时执行嵌入和FAISS检索的最大线程数
+            token_budget: 返回给Agent的上下文的token预算(tiktoken计数)，为None时不限制
         """
         super().__init__()
         self.llm = llm  # 保留但不使用
-        self.base_retriever = self._create_base_retriever(pdf_path, k)
+        self.ingest_workers = ingest_workers
+        self.embedding_backend = embedding_backend
+        self.embedding_batch_size = embedding_batch_size
+        self.embedding_threads = embedding_threads
+        self.quantize_embeddings = quantize_embeddings
+        self.k = k
+        self.hybrid = hybrid
+        self.rrf_k = rrf_k
+        self.index_type = index_type
+        self.index_params = index_params
+        self.search_params = search_params
+        self.mmap_index = mmap_index
+        self.max_async_workers = max_async_workers
+        # 线程池在第一次异步检索时创建
+        self.executor = None
+        self.token_budget = token_budget
+        self.embedding_cache = LRUTTLCache(query_cache_size, query_cache_ttl, query_cache_path, table="query_embeddings")
+        self.result_cache = LRUTTLCache(query_cache_size, query_cache_ttl, query_cache_path, table="retrieval_results")
+        self.base_retriever = self._create_base_retriever(pdf_path, k, cache_dir)
     
-    def _create_base_retriever(self, pdf_path: str, k: int):
+    def _create_base_retriever(self, pdf_path: str, k: int, cache_dir: Optional[str] = None):
         """创建基础文档检索器"""
-        # 1. 加载文档
-        docs = self._load_documents(pdf_path)
+        # 1. 创建嵌入模型
+        embeddings = self.embeddings = create_embeddings(
+            self.embedding_backend,
+            model_name=EMBEDDING_MODEL_NAME,
+            batch_size=self.embedding_batch_size,
+            num_threads=self.embedding_threads,
+            quantize=self.quantize_embeddings
+        )
         
-        # 2. 创建向量存储
-        embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-        vectorstore = FAISS.from_documents(docs, embeddings)
+        # 2. 加载缓存的向量存储，并与知识库目录增量同步
+        vectorstore = self._load_or_build_vectorstore(pdf_path, embeddings, cache_dir)
+        self.vectorstore = vectorstore
+        apply_search_params(vectorstore.index, self.search_params)
+        
+        # 索引变化后，之前缓存的查询结果全部失效
+        self.embedding_cache.set_namespace(self.index_fingerprint)
+        self.result_cache.set_namespace(self.index_fingerprint)
         
         # 3. 创建检索器
         return vectorstore.as_retriever(search_kwargs={"k": k})
     
+    def _list_source_files(self, source_path: str) -> Dict[str, str]:
+        """列出知识库中的PDF文件
+        
+        Returns:
+            Dict[str, str]: 相对路径 -> 绝对路径
+        """
+        if os.path.isfile(source_path):
+            return {os.path.basename(source_path): source_path}
+        
+        files = {}
+        for root, _, names in os.walk(source_path):
+            for name in names:
+                if name.lower().endswith(".pdf"):
+                    full_path = os.path.join(root, name)
+                    files[os.path.relpath(full_path, source_path).replace(os.sep, "/")] = full_path
+        return dict(sorted(files.items()))
+    
+    def _file_hash(self, file_path: str) -> str:
+        """计算文件内容的SHA-256"""
+        hasher = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                hasher.update(block)
+        return hasher.hexdigest()
+    
+    def _index_cache_key(self, source_path: str) -> str:
+        """根据知识库路径和分块/嵌入设置计算索引缓存键
+        
+        文件内容的变化由清单(manifest)跟踪，不参与缓存键的计算。
+        """
+        settings = {
+            "version": INDEX_CACHE_VERSION,
+            "source": os.path.abspath(source_path),
+            "chunk_size": CHUNK_SIZE,
+            "chunk_overlap": CHUNK_OVERLAP,
+            "separators": SEPARATORS,
+            "embedding": embedding_settings(self.embedding_backend, EMBEDDING_MODEL_NAME, self.quantize_embeddings),
+            "index": index_build_settings(self.index_type, self.index_params),
+        }
+        return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+    
+    def _load_or_build_vectorstore(self, source_path: str, embeddings, cache_dir: Optional[str]):
+        """加载缓存的FAISS索引，并与知识库目录增量同步
+
+        多个进程(如服务的多个worker)共用同一个缓存目录时，用文件锁保证同一时间只有一个进程
+        构建和替换索引，其他进程等待后直接加载构建好的索引。
+        """
+        if cache_dir is None:
+            return self._sync_vectorstore(source_path, embeddings, None)
+        os.makedirs(cache_dir, exist_ok=True)
+        with FileLock(os.path.join(cache_dir, f"{self._index_cache_key(source_path)}.lock")):
+            return self._sync_vectorstore(source_path, embeddings, cache_dir)
+    
+    def _sync_vectorstore(self, source_path: str, embeddings, cache_dir: Optional[str]):
+        """加载缓存的FAISS索引，并只对新增或修改的文件重新嵌入，删除已移除文件的向量 (调用方需持有缓存目录的锁)"""
+        files = self._list_source_files(source_path)
+        if not files:
+            raise ValueError(f"No PDF documents found at {source_path}")
+        hashes = {rel_path: self._file_hash(full_path) for rel_path, full_path in files.items()}
+        
+        # 索引指纹: 设置和所有文件内容都相同时不变，用于使查询缓存失效
+        settings_key = self._index_cache_key(source_path)
+        self.index_fingerprint = hashlib.sha256(
+            (settings_key + json.dumps(hashes, sort_keys=True)).encode("utf-8")
+        ).hexdigest()
+        
+        vectorstore = None
+        bm25 = None
+        manifest = {"files": {}}
+        index_dir = None
+        if cache_dir is not None:
+            index_dir = os.path.join(cache_dir, settings_key)
+            if os.path.exists(os.path.join(index_dir, "index.faiss")):
+                try:
+                    with open(os.path.join(index_dir, "manifest.json"), "r", encoding="utf-8") as f:
+                        manifest = json.load(f)
+                    unchanged = {rel: entry["sha256"] for rel, entry in manifest["files"].items()} == hashes
+                    # 知识库没有变化时以内存映射方式加载(只读)，需要增量更新时完整读入内存
+                    vectorstore = load_vectorstore(index_dir, embeddings, mmap=self.mmap_index and unchanged)
+                    bm25 = BM25Index.load(os.path.join(index_dir, "bm25.json"))
+                except Exception as e:
+                    print(f"Failed to load cached index, rebuilding: {e}")
+                    vectorstore, bm25, manifest = None, None, {"files": {}}
+        
+        indexed = manifest["files"]
+        stale = [rel for rel, entry in indexed.items() if hashes.get(rel) != entry["sha256"]]
+        pending = [rel for rel in files if rel not in indexed or rel in stale]
+        if bm25 is None:
+            bm25 = BM25Index()
+        self.bm25_index = bm25
+        if vectorstore is not None and not stale and not pending:
+            return vectorstore
+        
+        # 删除已移除或已修改文件的向量和倒排索引条目
+        stale_ids = [doc_id for rel in stale for doc_id in indexed.pop(rel)["ids"]]
+        if vectorstore is not None and stale_ids:
+            if supports_remove(vectorstore.index):
+                vectorstore.delete(stale_ids)
+            else:
+                # IVF-PQ和HNSW无法与FAISS.delete的重新编号保持一致，只能全部重建
+                print("Index type does not support removing vectors, rebuilding the whole index")
+                vectorstore, bm25 = None, BM25Index()
+                self.bm25_index = bm25
+                indexed.clear()
+                pending = list(files)
+        bm25.remove_documents(stale_ids)
+        
+        # 只嵌入新增或修改的文件
+        new_docs, new_ids = [], []
+        for rel in pending:
+            docs = self._load_documents(files[rel])
+            ids = [f"{rel}@{hashes[rel][:12]}#{i}" for i in range(len(docs))]
+            for doc, doc_id in zip(docs, ids):
+                doc.metadata["source"] = rel
+                doc.metadata["id"] = doc_id
+            new_docs.extend(docs)
+            new_ids.extend(ids)
+            indexed[rel] = {"sha256": hashes[rel], "ids": ids}
+        
+        if new_docs:
+            if vectorstore is None:
+                # 一次性嵌入所有文档，IVF-PQ需要用全部向量训练
+                vectorstore = create_vectorstore(new_docs, new_ids, embeddings, self.index_type, self.index_params)
+            else:
+                vectorstore.add_documents(new_docs, ids=new_ids)
+            # 在同一次导入中建立词法索引
+            bm25.add_documents(new_ids, [doc.page_content for doc in new_docs])
+        
+        if vectorstore is None:
+            raise ValueError(f"No text could be extracted from the PDF documents at {source_path}")
+        
+        if index_dir is not None:
+            self._save_vectorstore(vectorstore, bm25, manifest, index_dir)
+        return vectorstore
+    
+    def _save_vectorstore(self, vectorstore, bm25: BM25Index, manifest: Dict[str, Any], index_dir: str):
+        """保存FAISS索引、BM25倒排索引和文件清单 (调用方需持有缓存目录的锁)"""
+        # 先写入临时目录再替换，避免中断时留下不完整的缓存
+        tmp_dir = f"{index_dir}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        vectorstore.save_local(tmp_dir)
+        bm25.save(os.path.join(tmp_dir, "bm25.json"))
+        with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        shutil.rmtree(index_dir, ignore_errors=True)
+        os.replace(tmp_dir, index_dir)
+    
     def _load_documents(self, pdf_path: str) -> List[Document]:
-        """加载并处理PDF文档"""
-        # 加载PDF
-        loader = PyPDFLoader(pdf_path)
-        documents = loader.load()
-        
-        # 分块
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=256,
-            chunk_overlap=50,
-            separators=["\n\n", "\n", " ", ""]
+        """加载并分块PDF文档，页数较多时使用进程池并行解析"""
+        return load_pdf_chunks(
+            pdf_path,
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            separators=SEPARATORS,
+            max_workers=self.ingest_workers
         )
+    
+    def _result_key(self, normalized: str) -> str:
+        """检索结果缓存键"""
+        return f"{'hybrid' if self.hybrid else 'dense'}:{self.k}:{normalized}"
+    
+    def _cached_results(self, normalized: str) -> Optional[List[Document]]:
+        """从检索结果缓存中读取，未命中时返回None"""
+        cached = self.result_cache.get(self._result_key(normalized))
+        if cached is None:
+            return None
+        return [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in cached]
+    
+    def _search(self, normalized: str, embedding: List[float]) -> List[Document]:
+        """用查询嵌入检索，并写入检索结果缓存"""
+        if self.hybrid:
+            docs = self._hybrid_search(normalized, embedding)
+        else:
+            docs = self.vectorstore.similarity_search_by_vector(embedding, k=self.k)
+        self.result_cache.set(self._result_key(normalized),
+                              [{"page_content": d.page_content, "metadata": d.metadata} for d in docs])
+        return docs
+    
+    def _retrieve(self, query: str) -> List[Document]:
+        """检索相关文档，优先使用查询嵌入和检索结果缓存"""
+        normalized = normalize_query(query)
+        cached = self._cached_results(normalized)
+        if cached is not None:
+            return cached
         
-        # 分割文本
-        texts = text_splitter.split_text("\n".join([doc.page_content for doc in documents]))
+        embedding = self.embedding_cache.get(normalized)
+        if embedding is None:
+            embedding = self.embeddings.embed_query(normalized)
+            self.embedding_cache.set(normalized, embedding)
+        return self._search(normalized, embedding)
+    
+    def _hybrid_search(self, query: str, embedding: List[float]) -> List[Document]:
+        """分别做向量检索和BM25检索，再用倒数排名融合合并两个结果列表"""
+        fetch_k = max(self.k * 4, 20)
+        dense_docs = self.vectorstore.similarity_search_by_vector(embedding, k=fetch_k)
+        dense_ids = [doc.metadata["id"] for doc in dense_docs]
+        lexical_ids = [doc_id for doc_id, _ in self.bm25_index.search(query, fetch_k)]
         
-        # 转换为Document对象
-        return [Document(page_content=text) for text in texts]
+        docs_by_id = {doc.metadata["id"]: doc for doc in dense_docs}
+        results = []
+        for doc_id, _ in reciprocal_rank_fusion([dense_ids, lexical_ids], k=self.rrf_k):
+            doc = docs_by_id.get(doc_id) or self.vectorstore.docstore.search(doc_id)
+            if isinstance(doc, Document):
+                results.append(doc)
+            if len(results) == self.k:
+                break
+        return results
+    
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """返回查询嵌入缓存和检索结果缓存的命中统计"""
+        return {"embeddings": self.embedding_cache.stats(), "results": self.result_cache.stats()}
+    
+    def _format_results(self, docs: List[Document]) -> Tuple[str, Dict[str, Any]]:
+        """将检索到的文档打包为不超过token预算的字符串
+        
+        相邻分块会被合并并去掉重叠文本。返回给Agent的文本只包含段落，
+        节省的token数等统计信息单独返回，不占用提示的token。
+        
+        Returns:
+            Tuple[str, Dict[str, Any]]: (打包后的文本, pack_documents的统计信息)
+        """
+        if not docs:
+            return "No relevant documents found.", {}
+        
+        return pack_documents(docs, self.token_budget, max_overlap=CHUNK_OVERLAP * 2)
+    
+    def retrieve_context(self, query: str) -> Tuple[str, Dict[str, Any]]:
+        """检索并打包上下文
+        
+        统计信息随结果返回，而不是保存在工具上: 服务中所有会话共用同一个工具实例。
+        
+        Args:
+            query: 用户查询
+            
+        Returns:
+            Tuple[str, Dict[str, Any]]: (返回给Agent的上下文, 打包统计信息)
+        """
+        return self._format_results(self._retrieve(query))
     
     def _run(self, query: str) -> str:
         """运行检索并返回相关文档内容
@@ -68,25 +391,88 @@ class HistoryAwareRetrieverTool(BaseTool):
         """
         try:
             # 直接使用原始查询，不再使用历史感知
-            docs = self.base_retriever.get_relevant_documents(query)
-            
-            # 格式化结果
-            results = []
-            for i, doc in enumerate(docs, 1):
-                results.append(f"[Document {i}]\n{doc.page_content.strip()}")
-            
-            # 返回格式化的结果字符串
-            if results:
-                return "\n\n".join(results)
-            else:
-                return "No relevant documents found."
+            context, _ = self.retrieve_context(query)
+            return context
+        except Exception as e:
+            return f"Error during retrieval: {str(e)}"
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """获取执行嵌入和FAISS检索的有界线程池"""
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_async_workers,
+                                               thread_name_prefix="retriever")
+        return self.executor
+    
+    async def _in_executor(self, func, *args):
+        """在线程池中执行CPU密集的调用，不阻塞事件循环
+        
+        等待中的任务被取消时，尚未开始执行的调用也会被取消。
+        """
+        return await asyncio.wrap_future(self._get_executor().submit(func, *args))
+    
+    async def _arun(self, query: str) -> str:
+        """异步运行检索，嵌入、FAISS检索和上下文打包(tiktoken)都在线程池中执行
+        
+        Args:
+            query: 用户查询
+        """
+        try:
+            context, _ = await self._in_executor(self.retrieve_context, query)
+            return context
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             return f"Error during retrieval: {str(e)}"
     
-    def _arun(self, query: str):
-        """异步运行 - 不实现"""
-        raise NotImplementedError("This tool does not support async")
+    async def aretrieve_many(self, queries: List[str], timeout: Optional[float] = None) -> List[List[Document]]:
+        """批量异步检索，供一个事件循环同时服务多个会话
+        
+        未命中缓存的查询合并为一次批量嵌入，再并发执行检索。
+        
+        Args:
+            queries: 查询列表
+            timeout: 整体超时(秒)，超时后未开始的检索会被取消
+            
+        Returns:
+            List[List[Document]]: 与queries一一对应的检索结果
+        """
+        return await asyncio.wait_for(self._aretrieve_many(queries), timeout)
+    
+    async def _aretrieve_many(self, queries: List[str]) -> List[List[Document]]:
+        """aretrieve_many的实现"""
+        normalized = [normalize_query(query) for query in queries]
+        results: List[Optional[List[Document]]] = [self._cached_results(q) for q in normalized]
+        
+        # 收集需要嵌入的查询(去重)
+        embeddings: Dict[str, List[float]] = {}
+        to_embed = []
+        for q, cached in zip(normalized, results):
+            if cached is not None or q in embeddings or q in to_embed:
+                continue
+            embedding = self.embedding_cache.get(q)
+            if embedding is None:
+                to_embed.append(q)
+            else:
+                embeddings[q] = embedding
+        
+        if to_embed:
+            vectors = await self._in_executor(self.embeddings.embed_documents, to_embed)
+            for q, vector in zip(to_embed, vectors):
+                self.embedding_cache.set(q, vector)
+                embeddings[q] = vector
+        
+        # 相同的查询只检索一次 (先去重再创建协程，避免重复的协程未被等待)
+        uncached = list(dict.fromkeys(q for q, cached in zip(normalized, results) if cached is None))
+        searched = dict(zip(uncached, await asyncio.gather(
+            *(self._in_executor(self._search, q, embeddings[q]) for q in uncached)
+        )))
+        return [cached if cached is not None else searched[q] for q, cached in zip(normalized, results)]
 
-def create_history_aware_retriever_tool(llm, pdf_path: str, k: int = 5):
-    """创建检索工具实例 (不再具有历史感知能力)"""
-    return HistoryAwareRetrieverTool(llm, pdf_path, k)
\ No newline at end of file
+def create_history_aware_retriever_tool(llm, pdf_path: str, k: int = 5, cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+                                        **kwargs):
+    """创建检索工具实例 (不再具有历史感知能力)
+    
+    pdf_path可以是单个PDF文件，也可以是知识库目录(如knowledge_database/)。
+    其余关键字参数(如embedding_backend)传给HistoryAwareRetrieverTool。
+    """
+    return HistoryAwareRetrieverTool(llm, pdf_path, k, cache_dir, **kwargs)
\ No newline at end of file
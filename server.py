@@ -0,0 +1,323 @@
+# server.py - 多会话的异步HTTP/WebSocket服务: 每个会话有自己的Agent和记忆，LLM和工具每个进程只创建一次
+#
+# 运行 (在仓库根目录):
+#   uvicorn server:app --host 0.0.0.0 --port 8000 --workers 4
+#   python server.py --port 8000 --workers 4
+#
+# 会话保存在创建它的worker进程中:
+# - WebSocket /ws 的会话与连接绑定，整个连接由同一个worker处理，可以直接使用多个worker
+# - HTTP接口 /sessions/... 在多个worker时需要负载均衡按会话ID保持粘性，或者只使用一个worker
+# 检索索引、职位存储和网页缓存都保存在磁盘上，多个worker共用，不会重复建索引和抓取;
+# 首次启动时由一个worker在文件锁内构建检索索引，其他worker等待后直接加载。
+# 默认的flat检索索引在每个worker的内存中各有一份; 设置 CAREER_INDEX_TYPE=ivfpq 时
+# 倒排表以内存映射方式加载，多个worker共享同一份内存页(知识库太小无法训练IVF-PQ时仍退回flat)。
+# 会话数上限按worker计算，总上限为 worker数 x CAREER_MAX_SESSIONS。
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+
+from fastapi import FastAPI, HTTPException, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from answer_streaming import StreamEvent, astream_agent
+from agent import KNOWLEDGE_DIR, WELCOME_MESSAGE, build_agent, build_tools, get_chat_llm
+
+# 每个worker的最大会话数，以及会话空闲多久(秒)后被回收
+MAX_SESSIONS = int(os.environ.get("CAREER_MAX_SESSIONS", "100"))
+SESSION_IDLE_TIMEOUT = float(os.environ.get("CAREER_SESSION_IDLE_TIMEOUT", "1800"))
+
+# 检查空闲会话的间隔(秒)
+REAP_INTERVAL = 60
+
+# 会话已满时建议客户端等待的时间(秒)
+RETRY_AFTER_SECONDS = 30
+
+ERROR_MESSAGE = "I apologize for the error. How else can I assist you?"
+
+
+class UserProfile(BaseModel):
+    """客户端收集好的用户画像，字段与interactive_user_profile_collection返回的一致"""
+    age: int = Field(..., gt=0, lt=120)
+    education_background: str = Field(..., min_length=1)
+    occupation_status: int = Field(..., ge=0, le=3)
+    working_experience: Union[int, str] = 0
+
+
+class HistoryMessage(BaseModel):
+    role: str
+    content: str
+
+
+class CreateSessionRequest(BaseModel):
+    user_profile: UserProfile
+    history: List[HistoryMessage] = []
+
+
+class ChatRequest(BaseModel):
+    message: str = Field(..., min_length=1)
+
+
+class SessionLimitError(Exception):
+    """会话数已达上限"""
+
+
+class Session:
+    """一个用户会话: Agent(包含会话记忆)和最近活动时间"""
+
+    def __init__(self, session_id: str, agent):
+        self.session_id = session_id
+        self.agent = agent
+        self.turns = 0
+        self.last_active = time.monotonic()
+        # 同一会话的消息依次处理，记忆中的对话不会交错
+        self.lock = asyncio.Lock()
+
+    async def stream(self, message: str) -> AsyncIterator[StreamEvent]:
+        """处理一条用户消息，依次产出回答的token、工具调用事件，最后是完整回答"""
+        async with self.lock:
+            self.last_active = time.monotonic()
+            try:
+                async for event in astream_agent(self.agent, message):
+                    yield event
+            except Exception as e:
+                print(f"Error in session {self.session_id}: {str(e)}")
+                yield {"type": "answer", "content": ERROR_MESSAGE}
+            finally:
+                self.turns += 1
+                self.last_active = time.monotonic()
+
+    async def chat(self, message: str) -> str:
+        """处理一条用户消息，返回Agent的完整回答"""
+        answer = ERROR_MESSAGE
+        async for event in self.stream(message):
+            if event["type"] == "answer":
+                answer = event["content"]
+        return answer
+
+
+class SessionManager:
+    """保存一个worker进程中的所有会话
+
+    所有会话共用同一个LLM和同一组工具，每个会话只创建自己的提示和记忆。
+    """
+
+    def __init__(self, llm, tools: List[Any], max_sessions: int = MAX_SESSIONS,
+                 idle_timeout: float = SESSION_IDLE_TIMEOUT):
+        """初始化会话管理器
+
+        Args:
+            llm: 共用的聊天语言模型
+            tools: 共用的工具列表
+            max_sessions: 最大会话数
+            idle_timeout: 会话空闲多久(秒)后被回收
+        """
+        self.llm = llm
+        self.tools = tools
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions: Dict[str, Session] = {}
+        self._creating = 0
+        self.expired = 0
+        self.rejected = 0
+
+    async def create(self, user_profile: Dict[str, Any], history: Optional[List[Dict[str, str]]] = None) -> Session:
+        """创建会话，达到上限时先回收空闲的会话
+
+        初始对话历史超出记忆预算时会调用LLM生成摘要，Agent在线程池中创建，不阻塞事件循环。
+
+        Raises:
+            SessionLimitError: 回收后仍然没有空位
+        """
+        if len(self.sessions) + self._creating >= self.max_sessions:
+            self.expire_idle()
+        if len(self.sessions) + self._creating >= self.max_sessions:
+            self.rejected += 1
+            raise SessionLimitError(f"Session limit reached ({self.max_sessions})")
+
+        # 创建期间占用一个名额，并发的创建请求不会超出上限
+        self._creating += 1
+        try:
+            agent = await asyncio.to_thread(build_agent, self.llm, self.tools, user_profile, history, False)
+        finally:
+            self._creating -= 1
+        session = Session(uuid.uuid4().hex, agent)
+        self.sessions[session.session_id] = session
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        return self.sessions.get(session_id)
+
+    def close(self, session_id: str) -> bool:
+        return self.sessions.pop(session_id, None) is not None
+
+    def expire_idle(self) -> int:
+        """回收空闲超时的会话(正在处理消息的会话除外)，返回回收的数量"""
+        deadline = time.monotonic() - self.idle_timeout
+        expired = [
+            session_id for session_id, session in self.sessions.items()
+            if session.last_active < deadline and not session.lock.locked()
+        ]
+        for session_id in expired:
+            del self.sessions[session_id]
+        self.expired += len(expired)
+        return len(expired)
+
+    async def reap_forever(self, interval: float = REAP_INTERVAL):
+        """定期回收空闲会话"""
+        while True:
+            await asyncio.sleep(interval)
+            self.expire_idle()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self.sessions),
+            "max_sessions": self.max_sessions,
+            "busy": sum(1 for session in self.sessions.values() if session.lock.locked()),
+            "expired": self.expired,
+            "rejected": self.rejected,
+        }
+
+
+def _model_dict(model: BaseModel) -> Dict[str, Any]:
+    """pydantic v1/v2通用的转dict"""
+    return model.model_dump() if hasattr(model, "model_dump") else model.dict()
+
+
+def create_app(llm=None, tools: Optional[List[Any]] = None, max_sessions: int = MAX_SESSIONS,
+               idle_timeout: float = SESSION_IDLE_TIMEOUT, knowledge_dir: str = KNOWLEDGE_DIR) -> FastAPI:
+    """创建服务
+
+    Args:
+        llm: 共用的聊天语言模型，为None时在启动时用get_chat_llm创建
+        tools: 共用的工具列表，为None时在启动时用build_tools创建(加载检索索引)
+        max_sessions: 每个worker的最大会话数
+        idle_timeout: 会话空闲多久(秒)后被回收
+        knowledge_dir: 知识库目录
+    """
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # LLM客户端和工具每个进程只创建一次; 加载或构建检索索引较慢，放到线程中执行，不阻塞事件循环
+        shared_llm = llm if llm is not None else get_chat_llm()
+        shared_tools = tools if tools is not None else await asyncio.to_thread(build_tools, shared_llm, knowledge_dir)
+        app.state.sessions = SessionManager(shared_llm, shared_tools, max_sessions, idle_timeout)
+        reaper = asyncio.create_task(app.state.sessions.reap_forever())
+        try:
+            yield
+        finally:
+            reaper.cancel()
+
+    app = FastAPI(title="Clean Energy Career Agent", lifespan=lifespan)
+
+    def session_or_404(session_id: str) -> Session:
+        session = app.state.sessions.get(session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Session not found or expired")
+        return session
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", **app.state.sessions.stats()}
+
+    @app.post("/sessions", status_code=201)
+    async def create_session(request: CreateSessionRequest):
+        try:
+            session = await app.state.sessions.create(
+                _model_dict(request.user_profile), [_model_dict(message) for message in request.history]
+            )
+        except SessionLimitError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+        return {"session_id": session.session_id, "message": WELCOME_MESSAGE}
+
+    @app.post("/sessions/{session_id}/messages")
+    async def send_message(session_id: str, request: ChatRequest):
+        session = session_or_404(session_id)
+        return {"session_id": session_id, "response": await session.chat(request.message)}
+
+    @app.post("/sessions/{session_id}/stream")
+    async def stream_message(session_id: str, request: ChatRequest):
+        """以Server-Sent Events返回回答的token和工具调用事件，最后一个事件是完整回答"""
+        session = session_or_404(session_id)
+
+        async def events():
+            async for event in session.stream(request.message):
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    @app.delete("/sessions/{session_id}", status_code=204)
+    async def delete_session(session_id: str):
+        if not app.state.sessions.close(session_id):
+            raise HTTPException(status_code=404, detail="Session not found or expired")
+        return Response(status_code=204)
+
+    @app.websocket("/ws")
+    async def websocket_chat(websocket: WebSocket):
+        """WebSocket会话
+
+        第一条消息: {"user_profile": {...}, "history": [...]}，返回 {"type": "session", ...}
+        之后每条消息: {"message": "..."}，依次返回 {"type": "token"}、{"type": "tool_start"}等流式事件，
+        最后是 {"type": "answer", "content": "..."}
+        连接断开时会话随之结束。
+        """
+        await websocket.accept()
+        try:
+            request = CreateSessionRequest(**await websocket.receive_json())
+        except WebSocketDisconnect:
+            return
+        except Exception as e:
+            await websocket.send_json({"type": "error", "detail": f"Invalid session request: {str(e)}"})
+            await websocket.close(code=1008)
+            return
+
+        try:
+            session = await app.state.sessions.create(
+                _model_dict(request.user_profile), [_model_dict(message) for message in request.history]
+            )
+        except SessionLimitError as e:
+            await websocket.send_json({"type": "error", "detail": str(e), "retry_after": RETRY_AFTER_SECONDS})
+            # 1013: Try Again Later
+            await websocket.close(code=1013)
+            return
+
+        try:
+            await websocket.send_json({"type": "session", "session_id": session.session_id, "message": WELCOME_MESSAGE})
+            while True:
+                data = await websocket.receive_json()
+                message = str(data.get("message", "")).strip() if isinstance(data, dict) else ""
+                if not message:
+                    await websocket.send_json({"type": "error", "detail": "Expected {\"message\": \"...\"}"})
+                    continue
+                async for event in session.stream(message):
+                    await websocket.send_json(event)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            app.state.sessions.close(session.session_id)
+
+    return app
+
+
+app = create_app()
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Multi-session HTTP/WebSocket service for the clean energy career agent")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes; each builds its own LLM client and tools")
+    args = parser.parse_args()
+    uvicorn.run("server:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,115 @@
 # web_search_tool.py - 使用DuckDuckGo的网络搜索工具
 
-import requests
 from langchain.tools import BaseTool
-from bs4 import BeautifulSoup
+from pydantic import Field
+import codecs
 import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import Optional, Type, List, Dict, Any
 import re
+import threading
 import urllib.parse
 
+from context_packer import pack_documents
+from html_parsing import extract_main_text, parse_duckduckgo_results
+from http_client import get_http_client
+from page_index import PASSAGE_CHUNK_OVERLAP, PageIndex
+from result_cache import LRUTTLCache, normalize_query
+
+# DuckDuckGo的HTML版搜索地址
+DUCKDUCKGO_URL = "https://html.duckduckgo.com/html/"
+
+# 搜索结果的默认磁盘缓存路径和有效期(秒)
+DEFAULT_SEARCH_CACHE = os.path.join(".web_cache", "search.db")
+DEFAULT_SEARCH_TTL = 6 * 3600
+
+# 只提取这些类型的页面内容
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+
+# 流式读取页面时每次读取的字节数
+FETCH_CHUNK_BYTES = 16 * 1024
+
+# 没有声明字符集时，在页面开头查找<meta charset>
+META_CHARSET_PATTERN = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.IGNORECASE)
+
+# 建立段落索引时每个页面保留的正文最大字符数
+MAX_INDEXED_PAGE_CHARS = 20000
+
+# 页面正文缓存的默认有效期(秒)，有效期内每次使用前都用ETag/Last-Modified向服务器确认
+DEFAULT_PAGE_TTL = 7 * 24 * 3600
+
+REQUEST_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
 class WebSearchTool(BaseTool):
     name: str = "WebSearcher"
     description: str = "Searches the web for up-to-date information about clean energy industry trends, technologies, and latest news. Use this tool when you need current information not available in your knowledge base."
+    search_url: str = DUCKDUCKGO_URL
+    search_cache: Any = Field(default=None, exclude=True)
+    http: Any = Field(default=None, exclude=True)
+    fetch_top: int = 3
+    fetch_budget: float = 5.0
+    max_page_bytes: int = 512 * 1024
+    max_page_chars: int = 2000
+    embeddings: Any = Field(default=None, exclude=True)
+    embedding_backend: str = "huggingface"
+    page_index: Any = Field(default=None, exclude=True)
+    page_cache: Any = Field(default=None, exclude=True)
+    pages_not_modified: int = 0
+    stats_lock: Any = Field(default=None, exclude=True)
+    passage_token_budget: Optional[int] = 800
+    passage_k: int = 6
     
-    def __init__(self):
-        """初始化网络搜索工具，使用DuckDuckGo不需要API密钥"""
+    def __init__(self, search_url: str = DUCKDUCKGO_URL, cache_size: int = 128,
+                 cache_ttl: Optional[float] = DEFAULT_SEARCH_TTL, cache_path: Optional[str] = DEFAULT_SEARCH_CACHE,
+                 fetch_top: int = 3, fetch_budget: float = 5.0, max_page_bytes: int = 512 * 1024,
+                 max_page_chars: int = 2000, embeddings=None, embedding_backend: str = "huggingface",
+                 passage_token_budget: Optional[int] = 800, passage_k: int = 6, page_cache_size: int = 64,
+                 page_cache_ttl: Optional[float] = DEFAULT_PAGE_TTL, http_client=None):
+        """初始化网络搜索工具，使用DuckDuckGo不需要API密钥
+        
+        Args:
+            search_url: 搜索地址，测试和压测时可指向本地的替代服务器
+            cache_size: 内存中缓存的查询数
+            cache_ttl: 搜索结果的有效期(秒)，为None时不过期
+            cache_path: 共享的SQLite磁盘缓存路径，为None时只使用内存缓存
+            fetch_top: 并发抓取正文的搜索结果数，为0时只返回摘要
+            fetch_budget: 抓取正文阶段的总时间预算(秒)，超时的页面只显示摘要
+            max_page_bytes: 每个页面最多读取的字节数
+            max_page_chars: 不使用段落检索时，每个页面返回的正文最大字符数
+            embeddings: 段落检索使用的嵌入对象(可与检索工具共用)，为None时首次使用时按embedding_backend创建
+            embedding_backend: 需要自行创建嵌入对象时使用的后端，"huggingface" 或 "onnx"
+            passage_token_budget: 返回的相关段落的token预算，为None时不做段落检索，只返回每个页面的开头部分
+            passage_k: 参与打包的最相关段落数
+            page_cache_size: 内存中缓存正文和分块向量的页面数，同一URL内容不变时不会重新解析和嵌入
+            page_cache_ttl: 页面正文缓存的有效期(秒)，正文与ETag/Last-Modified一起保存在cache_path中
+            http_client: 发送请求的http_client.HTTPClient，为None时使用进程内共享的客户端
+        """
         super().__init__()
+        self.search_url = search_url
+        self.fetch_top = fetch_top
+        self.fetch_budget = fetch_budget
+        self.max_page_bytes = max_page_bytes
+        self.max_page_chars = max_page_chars
+        self.embeddings = embeddings
+        self.embedding_backend = embedding_backend
+        self.passage_token_budget = passage_token_budget
+        self.passage_k = passage_k
+        self.http = http_client or get_http_client()
+        # 不同搜索地址的结果放在不同的命名空间中
+        self.search_cache = LRUTTLCache(cache_size, cache_ttl, cache_path, namespace=search_url, table="search_results")
+        # 按URL保存提取后的正文和验证器，服务器返回304时直接使用
+        self.page_cache = LRUTTLCache(page_cache_size, page_cache_ttl, cache_path, table="page_content")
+        # 分块向量与页面正文使用相同的有效期
+        self.page_index = None
+        if passage_token_budget is not None:
+            self.page_index = PageIndex(embeddings, cache_size=page_cache_size, cache_ttl=page_cache_ttl)
+        self.pages_not_modified = 0
+        # 抓取正文的线程并发更新计数
+        self.stats_lock = threading.Lock()
         
     def _run(self, query: str) -> str:
         """执行网络搜索
@@ -26,16 +121,63 @@ class WebSearchTool(BaseTool):
             str: 搜索结果摘要
         """
         try:
-            # 使用DuckDuckGo进行搜索
-            search_results = self._search_with_duckduckgo(query)
+            # 使用DuckDuckGo进行搜索，规范化后相同的查询共用缓存，并发的相同查询只请求一次;
+            # 空结果可能是临时的限流或页面结构变化，不写入缓存
+            search_results = self.search_cache.get_or_compute(
+                normalize_query(query), lambda: self._search_with_duckduckgo(query), cacheable=bool
+            )
+            
+            # 在时间预算内并发抓取前几个结果的正文
+            if self.fetch_top:
+                search_results = self._fetch_contents(search_results)
+            
+            # 只返回与查询最相关的段落，而不是每个页面的开头部分
+            passages = None
+            if self.page_index is not None and any(result.get("content") for result in search_results):
+                try:
+                    passages = self._relevant_passages(query, search_results)
+                except Exception as e:
+                    # 嵌入失败时退回显示每个页面的开头部分
+                    print(f"Passage retrieval failed, showing page excerpts instead: {e}")
             
             # 提取和格式化搜索结果
-            formatted_results = self._format_search_results(search_results)
+            formatted_results = self._format_search_results(search_results, passages)
             
             return formatted_results
         except Exception as e:
             return f"Error performing web search: {str(e)}"
     
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """搜索结果缓存和页面向量缓存的命中统计"""
+        stats = {"search": self.search_cache.stats(),
+                 "pages": self.page_cache.stats()}
+        with self.stats_lock:
+            stats["pages"]["not_modified"] = self.pages_not_modified
+        if self.page_index is not None:
+            stats["page_embeddings"] = self.page_index.cache_stats()
+        return stats
+    
+    def _relevant_passages(self, query: str, results: List[Dict]) -> str:
+        """在抓取到的页面上建立临时段落索引，按token预算打包最相关的段落
+        
+        Args:
+            query: 搜索查询
+            results: 带有content字段的搜索结果
+            
+        Returns:
+            str: 打包后的段落，每个段落注明来源URL
+        """
+        if self.page_index.embeddings is None:
+            # 没有传入嵌入对象时，首次使用才加载模型
+            from embedding_backends import create_embeddings
+            self.embeddings = self.page_index.embeddings = create_embeddings(self.embedding_backend)
+        
+        docs = self.page_index.top_passages(query, results, k=self.passage_k)
+        # 统计信息不保存在工具上: 服务中所有会话共用同一个工具实例
+        packed, _ = pack_documents(docs, self.passage_token_budget,
+                                   max_overlap=PASSAGE_CHUNK_OVERLAP * 2, show_source=True)
+        return packed
+    
     def _search_with_duckduckgo(self, query: str) -> List[Dict]:
         """使用DuckDuckGo执行搜索
         
@@ -46,67 +188,27 @@ class WebSearchTool(BaseTool):
             List[Dict]: 搜索结果列表
         """
         # 添加领域限定
-        full_query = urllib.parse.quote(query + " clean energy industry")
+        full_query = urllib.parse.quote(normalize_query(query) + " clean energy industry")
         
         # DuckDuckGo搜索URL
-        url = f"https://html.duckduckgo.com/html/?q={full_query}"
-        
-        # 设置请求头
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
+        url = f"{self.search_url}?q={full_query}"
         
         # 发送请求
-        response = requests.get(url, headers=headers)
+        response = self.http.get(url, headers=REQUEST_HEADERS)
         
         # 检查响应状态
         if response.status_code != 200:
             raise Exception(f"Search returned status code {response.status_code}")
         
-        # 解析HTML
-        soup = BeautifulSoup(response.text, "html.parser")
-        
-        # 提取搜索结果
-        results = []
-        
-        # DuckDuckGo的结果通常在class为"result"的div中
-        for result_div in soup.select(".result"):
-            try:
-                # 获取标题
-                title_elem = result_div.select_one(".result__title")
-                title = title_elem.get_text(strip=True) if title_elem else "No Title"
-                
-                # 获取链接
-                link_elem = result_div.select_one(".result__url")
-                link = link_elem.get_text(strip=True) if link_elem else "No Link"
-                if link and not link.startswith(('http://', 'https://')):
-                    link = "https://" + link
-                
-                # 获取摘要
-                snippet_elem = result_div.select_one(".result__snippet")
-                snippet = snippet_elem.get_text(strip=True) if snippet_elem else "No Snippet"
-                
-                # 将结果添加到列表
-                results.append({
-                    "title": title,
-                    "link": link,
-                    "snippet": snippet
-                })
-                
-                # 只获取前5个结果
-                if len(results) >= 5:
-                    break
-            except Exception as e:
-                print(f"Error parsing result: {e}")
-                continue
-        
-        return results
+        # 只解析搜索结果子树，只获取前5个结果
+        return parse_duckduckgo_results(response.text, limit=5)
     
-    def _format_search_results(self, results: List[Dict]) -> str:
+    def _format_search_results(self, results: List[Dict], passages: Optional[str] = None) -> str:
         """格式化搜索结果
         
         Args:
             results: 搜索结果列表
+            passages: 打包后的相关段落，为None时显示每个页面的开头部分
             
         Returns:
             str: 格式化的搜索结果
@@ -122,52 +224,140 @@ class WebSearchTool(BaseTool):
                 formatted_output += f"[Result {i}]\n"
                 formatted_output += f"Title: {title}\n"
                 formatted_output += f"Snippet: {snippet}\n"
+                if passages is None and result.get("content"):
+                    content = result["content"]
+                    if len(content) > self.max_page_chars:
+                        content = content[:self.max_page_chars].rsplit(" ", 1)[0] + "..."
+                    formatted_output += f"Content: {content}\n"
                 formatted_output += f"URL: {link}\n\n"
         else:
             formatted_output += "No relevant search results found.\n"
         
+        if passages:
+            formatted_output += f"Relevant Passages:\n\n{passages}\n"
+        
         return formatted_output
     
-    def _extract_content(self, url: str) -> str:
-        """从URL提取内容
+    def _fetch_contents(self, results: List[Dict]) -> List[Dict]:
+        """并发抓取前fetch_top个结果的正文
+        
+        整个阶段最多等待fetch_budget秒，超时、失败或不是HTML的页面保留原来的摘要。
         
         Args:
-            url: 网页URL
+            results: 搜索结果列表
             
         Returns:
-            str: 提取的内容
+            List[Dict]: 新的结果列表，抓取成功的结果增加content字段
         """
-        try:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
-            response = requests.get(url, headers=headers, timeout=10)
+        targets = [(i, result["link"]) for i, result in enumerate(results[:self.fetch_top])
+                   if "." in urllib.parse.urlsplit(result.get("link", "")).netloc]
+        if not targets:
+            return results
+        
+        # 建立段落索引时需要更完整的正文，只显示页面开头时读取max_page_chars个字符即可
+        max_chars = MAX_INDEXED_PAGE_CHARS if self.page_index is not None else self.max_page_chars
+        deadline = time.monotonic() + self.fetch_budget
+        executor = ThreadPoolExecutor(max_workers=len(targets))
+        futures = {executor.submit(self._extract_content, url, deadline, max_chars): i for i, url in targets}
+        done, _ = wait(futures, timeout=self.fetch_budget)
+        # 不等待超时的页面，读取循环会在截止时间后自行结束
+        executor.shutdown(wait=False, cancel_futures=True)
+        
+        results = [dict(result) for result in results]
+        for future in done:
+            try:
+                content = future.result()
+            except Exception:
+                continue
+            if content:
+                results[futures[future]]["content"] = content
+        return results
+    
+    def _extract_content(self, url: str, deadline: Optional[float] = None,
+                         max_chars: Optional[int] = None) -> Optional[str]:
+        """流式抓取网页并提取正文
+        
+        - 根据Content-Type提前跳过非HTML页面(PDF、图片等)，不下载响应体
+        - 最多读取max_page_bytes字节，超过截止时间时停止读取
+        - 去掉导航、页眉页脚、广告等页面框架
+        - 缓存过的页面发送If-None-Match/If-Modified-Since，服务器返回304时直接使用缓存的正文，
+          不下载也不重新解析
+        
+        Args:
+            url: 网页URL
+            deadline: time.monotonic()的截止时间，为None时使用fetch_budget
+            max_chars: 正文的最大字符数，为None时使用max_page_chars
             
+        Returns:
+            Optional[str]: 提取的正文；跳过或失败时为None
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.fetch_budget
+        max_chars = max_chars or self.max_page_chars
+        if deadline <= time.monotonic():
+            return None
+        
+        # 缓存的正文比需要的短时不能复用，重新完整抓取
+        cached = self.page_cache.get(url)
+        if cached is not None and cached["max_chars"] < max_chars:
+            cached = None
+        headers = dict(REQUEST_HEADERS)
+        if cached is not None:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        
+        with self.http.get(url, headers=headers, deadline=deadline, stream=True) as response:
+            if response.status_code == 304 and cached is not None:
+                with self.stats_lock:
+                    self.pages_not_modified += 1
+                text = cached["text"]
+                return text[:max_chars] if len(text) > max_chars else text
             if response.status_code != 200:
-                return f"Failed to fetch the page. Status code: {response.status_code}"
-            
-            # 解析HTML
-            soup = BeautifulSoup(response.text, "html.parser")
-            
-            # 移除脚本和样式元素
-            for script in soup(["script", "style"]):
-                script.extract()
-            
-            # 获取文本
-            text = soup.get_text(separator="\n", strip=True)
-            
-            # 简单处理文本(删除多余空行等)
-            lines = [line.strip() for line in text.splitlines() if line.strip()]
-            text = "\n".join(lines)
+                return None
+            content_type = response.headers.get("Content-Type", "").split(";", 1)[0].strip().lower()
+            if content_type and content_type not in HTML_CONTENT_TYPES:
+                return None
             
-            # 限制文本长度
-            return text[:8000] + ("..." if len(text) > 8000 else "")
-        except Exception as e:
-            return f"Error extracting content: {str(e)}"
+            body = bytearray()
+            complete = True
+            for chunk in response.iter_content(chunk_size=FETCH_CHUNK_BYTES):
+                body.extend(chunk)
+                if len(body) >= self.max_page_bytes:
+                    break
+                if time.monotonic() >= deadline:
+                    complete = False
+                    break
+            encoding = self._page_encoding(response, bytes(body[:4096]))
+            validators = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+        
+        html = bytes(body[:self.max_page_bytes]).decode(encoding, errors="replace")
+        text = extract_main_text(html, max_chars) or None
+        
+        # 只缓存有验证器、且没有因超时被截断的页面
+        if text and complete and (validators["etag"] or validators["last_modified"]):
+            self.page_cache.set(url, {"text": text, "max_chars": max_chars, **validators})
+        return text
+    
+    def _page_encoding(self, response, head: bytes) -> str:
+        """页面的字符编码: 响应头中的charset，其次是<meta charset>，默认为UTF-8"""
+        if "charset" in response.headers.get("Content-Type", "").lower() and response.encoding:
+            return response.encoding
+        match = META_CHARSET_PATTERN.search(head)
+        if match:
+            try:
+                return codecs.lookup(match.group(1).decode("ascii")).name
+            except (LookupError, UnicodeDecodeError):
+                pass
+        return "utf-8"
 
-def create_web_search_tool():
+def create_web_search_tool(**kwargs):
     """创建网络搜索工具实例"""
-    return WebSearchTool()
+    return WebSearchTool(**kwargs)
 
 # 测试代码
 if __name__ == "__main__":